@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark for MAUDEFetcher.parse_to_dataframe
+Compares the columnar parser against the original row-by-row parser on
+synthetic openFDA reports and checks that both produce the same DataFrame.
+
+    python bench_parse.py [rows]
+"""
+
+import random
+import sys
+import time
+
+import pandas as pd
+
+from maude_api_fetch import MAUDEFetcher
+
+
+def parse_rowwise(results):
+    """The original per-report parser, kept here as the baseline"""
+    parsed_data = []
+    for result in results:
+        row = {
+            'report_number': result.get('report_number'),
+            'event_type': result.get('event_type'),
+            'date_received': result.get('date_received'),
+            'date_of_event': result.get('date_of_event'),
+            'report_source_code': result.get('report_source_code'),
+            'manufacturer_contact_country': result.get('manufacturer_contact_t_country')
+        }
+        if 'device' in result and len(result['device']) > 0:
+            device = result['device'][0]
+            row['device_brand_name'] = device.get('brand_name')
+            row['device_generic_name'] = device.get('generic_name')
+            row['device_manufacturer'] = device.get('manufacturer_d_name')
+            row['device_class'] = device.get('openfda', {}).get('device_class')
+            row['device_name'] = device.get('device_name')
+        if 'patient' in result and len(result['patient']) > 0:
+            patient = result['patient'][0]
+            row['patient_sequence_number'] = patient.get('patient_sequence_number')
+            if 'sequence_number_outcome' in patient:
+                outcomes = patient['sequence_number_outcome']
+                if outcomes:
+                    row['outcome'] = outcomes[0] if isinstance(outcomes, list) else outcomes
+        if 'mdr_text' in result:
+            texts = result['mdr_text']
+            descriptions = [t.get('text', '') for t in texts if t.get('text_type_code') in ['Description of Event', 'Additional Manufacturer Narrative']]
+            row['event_description'] = ' | '.join(descriptions) if descriptions else ''
+        parsed_data.append(row)
+    return pd.DataFrame(parsed_data)
+
+
+def synthetic_reports(n, seed=0):
+    """Reports shaped like openFDA device events, with sections randomly missing"""
+    rng = random.Random(seed)
+    reports = []
+    for i in range(n):
+        report = {
+            'report_number': f'{3000000 + i}-2024-{i:05d}',
+            'event_type': rng.choice(['Malfunction', 'Injury', 'Death', 'Other']),
+            'date_received': f'2024{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}',
+            'date_of_event': rng.choice([None, '20231115']),
+            'report_source_code': 'Manufacturer report',
+            'manufacturer_contact_t_country': rng.choice(['US', 'IE', None]),
+        }
+        if rng.random() < 0.97:
+            report['device'] = [{
+                'brand_name': f'BRAND {i % 50}',
+                'generic_name': rng.choice(['PACEMAKER', 'INSULIN PUMP', 'STENT']),
+                'manufacturer_d_name': rng.choice(['MEDTRONIC', 'ABBOTT', 'BOSTON SCIENTIFIC']),
+                'openfda': {'device_class': rng.choice(['2', '3'])},
+                'device_name': 'DEVICE',
+            }]
+        if rng.random() < 0.9:
+            patient = {'patient_sequence_number': '1'}
+            if rng.random() < 0.8:
+                patient['sequence_number_outcome'] = rng.choice(
+                    [['Other'], ['Hospitalization', 'Required Intervention'], [], 'Death'])
+            report['patient'] = [patient]
+        if rng.random() < 0.95:
+            report['mdr_text'] = [
+                {'text': 'IT WAS REPORTED THAT THE DEVICE ' * 8, 'text_type_code': 'Description of Event'},
+                {'text': 'CONCOMITANT PRODUCTS ' * 4, 'text_type_code': 'Additional Manufacturer Narrative'},
+                {'text': 'EVALUATION SUMMARY', 'text_type_code': 'Additional Manufacturer Narrative'},
+            ][:rng.randint(0, 3)]
+        reports.append(report)
+    return reports
+
+
+def rows_per_second(parse, reports, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(reports)
+        best = min(best, time.perf_counter() - start)
+    return len(reports) / best
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    reports = synthetic_reports(n)
+    fetcher = MAUDEFetcher()
+
+    pd.testing.assert_frame_equal(parse_rowwise(reports), fetcher.parse_to_dataframe(reports))
+    print(f"Output identical for {n:,} reports")
+
+    before = rows_per_second(parse_rowwise, reports)
+    after = rows_per_second(fetcher.parse_to_dataframe, reports)
+    print(f"row-by-row: {before:>12,.0f} rows/s")
+    print(f"columnar:   {after:>12,.0f} rows/s  ({after / before:.1f}x)")
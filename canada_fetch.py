@@ -5,18 +5,24 @@ Source: Health Canada / CFIA Recalls & Safety Alerts open data
 Bulk JSON updated daily — no API key or pagination needed.
 """
 
+import gzip
+import json
+import os
+import threading
 import requests
 import pandas as pd
-from datetime import datetime, date
+from dataclasses import dataclass, field
+from datetime import datetime
 from io import StringIO
+from pathlib import Path
+
+from canada_index import RecallIndex
 
 BULK_URL = (
     "https://recalls-rappels.canada.ca/sites/default/files/"
     "opendata-donneesouvertes/HCRSAMOpenData.json"
 )
 
-# Recall class severity order (Type I = most severe)
-RECALL_CLASS_ORDER = {"Type I": 0, "Type II": 1, "Type III": 2, "": 3}
 
 # Known device categories in the dataset
 DEVICE_CATEGORIES = [
@@ -37,13 +43,114 @@ DEVICE_CATEGORIES = [
 ]
 
 
+@dataclass
+class RecallDiff:
+    """NIDs that changed between two downloads of the bulk feed."""
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+def _by_nid(records: list[dict]) -> dict[str, list[dict]]:
+    # A NID can appear on more than one record, so compare the group as a whole
+    groups: dict[str, list[dict]] = {}
+    for r in records:
+        groups.setdefault(str(r.get("NID", "")), []).append(r)
+    return groups
+
+
+def diff_records(old: list[dict], new: list[dict]) -> RecallDiff:
+    """Compare two downloads of the feed by NID."""
+    before, after = _by_nid(old), _by_nid(new)
+    return RecallDiff(
+        added=[nid for nid in after if nid not in before],
+        changed=[nid for nid in after if nid in before and after[nid] != before[nid]],
+        removed=[nid for nid in before if nid not in after],
+    )
+
+
 class CanadaRecallsFetcher:
     """Fetch and filter Canadian medical device recall data."""
 
-    def __init__(self):
+    def __init__(self, snapshot_dir: str | Path | None = None,
+                 stale_while_revalidate: bool = False):
+        """
+        snapshot_dir: where to keep the last download and its ETag /
+        Last-Modified validators. With it, a restart reuses the snapshot and
+        an unchanged feed costs a 304 instead of a full download. The search
+        index is saved there too: it is memory-mapped at startup so searches
+        are served at once while the feed is reloaded in the background.
+
+        stale_while_revalidate: once the TTL has passed, keep answering
+        searches from the current index and refresh it on a background
+        thread, instead of making the caller wait for the download.
+        """
         self._cache: list | None = None
         self._cache_time: datetime | None = None
         self._cache_ttl_minutes = 60  # re-download at most once per hour
+        self._validators: dict[str, str] = {}
+        self._downloaded_at = ""  # when the cached feed was last downloaded in full
+        self._lock = threading.RLock()
+        self._refresher: threading.Thread | None = None
+        self._refresher_lock = threading.Lock()  # guards starting it, never held while fetching
+        self.stale_while_revalidate = stale_while_revalidate
+        self.last_diff: RecallDiff | None = None  # changes found by the last download
+        self._index: RecallIndex | None = None
+        self._index_source: list | None = None  # the download the index was built from
+        self._index_built_from = ""  # downloaded_at of a saved index loaded from disk
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        if self.snapshot_dir:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            saved = RecallIndex.load(self.snapshot_dir)
+            if saved is None:
+                self._load_snapshot()
+            else:
+                self._index, self._index_built_from = saved
+                self._refresh_in_background()
+
+    # ── Snapshot on disk ──────────────────────────────────────────────────────
+
+    @property
+    def _snapshot_path(self) -> Path:
+        return self.snapshot_dir / "HCRSAMOpenData.json.gz"
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.snapshot_dir / "HCRSAMOpenData.meta.json"
+
+    def _load_snapshot(self):
+        try:
+            meta = json.loads(self._meta_path.read_text())
+            with gzip.open(self._snapshot_path, "rt", encoding="utf-8") as f:
+                self._cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._validators = meta.get("validators", {})
+        self._cache_time = datetime.fromisoformat(meta["fetched_at"])
+        self._downloaded_at = meta.get("downloaded_at", meta["fetched_at"])
+        if self._index is not None and self._index_built_from == self._downloaded_at:
+            self._index_source = self._cache
+
+
+    def _write_meta(self):
+        meta = {
+            "validators": self._validators,
+            "fetched_at": self._cache_time.isoformat(),
+            "downloaded_at": self._downloaded_at,
+        }
+        tmp = self._meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta, indent=2))
+        os.replace(tmp, self._meta_path)
+
+    def _save_snapshot(self, data: list):
+        tmp = self._snapshot_path.with_suffix(".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._snapshot_path)
+        self._write_meta()
 
     # ── Core fetch ────────────────────────────────────────────────────────────
 
@@ -51,21 +158,52 @@ class CanadaRecallsFetcher:
         """
         Download the full bulk JSON from Health Canada.
         Result is cached in-memory for `_cache_ttl_minutes` minutes.
+
+        Downloads are conditional on the previous ETag / Last-Modified, so an
+        unchanged feed returns 304 and the cached records are reused. After a
+        new download, `last_diff` lists the added, changed and removed NIDs.
         """
+        with self._lock:
+            return self._fetch_all_raw(force)
+
+    def _fetch_all_raw(self, force: bool) -> list[dict]:
         now = datetime.now()
         if (
             not force
             and self._cache is not None
             and self._cache_time is not None
-            and (now - self._cache_time).seconds < self._cache_ttl_minutes * 60
+            and not self.is_stale(now)
         ):
             return self._cache
 
-        resp = requests.get(BULK_URL, timeout=30)
+        headers = {}
+        if self._cache is not None:
+            if "etag" in self._validators:
+                headers["If-None-Match"] = self._validators["etag"]
+            if "last_modified" in self._validators:
+                headers["If-Modified-Since"] = self._validators["last_modified"]
+
+        resp = requests.get(BULK_URL, headers=headers, timeout=30)
+        if resp.status_code == 304:
+            self._cache_time = now
+            self.last_diff = RecallDiff()
+            if self.snapshot_dir:
+                self._write_meta()
+            return self._cache
         resp.raise_for_status()
         data = resp.json()
+
+        self.last_diff = diff_records(self._cache or [], data)
+        self._validators = {
+            key: resp.headers[header]
+            for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+            if header in resp.headers
+        }
         self._cache = data
         self._cache_time = now
+        self._downloaded_at = now.isoformat()
+        if self.snapshot_dir:
+            self._save_snapshot(data)
         return data
 
     def fetch_medical_devices(self, force: bool = False) -> list[dict]:
@@ -73,6 +211,64 @@ class CanadaRecallsFetcher:
         raw = self.fetch_all_raw(force=force)
         return [r for r in raw if r.get("Organization") == "Medical devices"]
 
+    def is_stale(self, now: datetime | None = None) -> bool:
+        """True when the cached feed is older than the TTL (or missing)."""
+        if self._cache_time is None:
+            return True
+        age = ((now or datetime.now()) - self._cache_time).total_seconds()
+        return age >= self._cache_ttl_minutes * 60
+
+    @property
+    def refreshing(self) -> bool:
+        return self._refresher is not None and self._refresher.is_alive()
+
+    def index(self, force: bool = False, fresh: bool = False) -> RecallIndex:
+        """
+        Columnar index of the medical device recalls, rebuilt once per download.
+
+        Only with stale_while_revalidate is an outdated index returned while
+        it is refreshed; otherwise a refresh in progress is waited for.
+        `fresh` waits in that mode too, for batch runs that must not match
+        against an outdated feed.
+        """
+        if not force and not fresh and self._index is not None and self.stale_while_revalidate:
+            if self.refreshing:
+                return self._index  # the refresh swaps in a new index when done
+            if self.is_stale():
+                self._refresh_in_background()
+                return self._index
+        return self._current_index(force)
+
+    # ── Background refresh ────────────────────────────────────────────────────
+
+    def _refresh_in_background(self):
+        with self._refresher_lock:
+            if not self.refreshing:
+                self._refresher = threading.Thread(target=self._refresh, daemon=True)
+                self._refresher.start()
+
+    def _refresh(self):
+        try:
+            # Builds the new index off to the side, then swaps the reference
+            self._current_index()
+        except requests.RequestException:
+            pass  # keep serving the current index; the next search retries
+
+    def _current_index(self, force: bool = False) -> RecallIndex:
+        # Waits for a refresh in progress, which holds the lock
+        with self._lock:
+            if self._cache is None and self.snapshot_dir:
+                # Started from a saved index: the download it came from
+                # carries the validators for a conditional fetch
+                self._load_snapshot()
+            raw = self.fetch_all_raw(force=force)
+            if self._index is None or self._index_source is not raw:
+                self._index = RecallIndex([r for r in raw if r.get("Organization") == "Medical devices"])
+                self._index_source = raw
+                if self.snapshot_dir:
+                    self._index.save(self.snapshot_dir, source=self._downloaded_at)
+            return self._index
+
     # ── Filter & search ───────────────────────────────────────────────────────
 
     def search(
@@ -88,83 +284,18 @@ class CanadaRecallsFetcher:
         """
         Filter medical device recalls and return a pandas DataFrame.
 
-        All text filters are case-insensitive substring matches.
+        All text filters are case-insensitive substring matches. Results are
+        sorted most severe class first, then most recently updated.
         """
-        records = self.fetch_medical_devices()
-
-        results = []
-        for r in records:
-            # Archived filter
-            if not include_archived and r.get("Archived", "0") == "1":
-                continue
-
-            # Date filter on "Last updated"
-            rec_date_str = r.get("Last updated", "")
-            if rec_date_str:
-                try:
-                    rec_date = date.fromisoformat(rec_date_str)
-                    if date_from and rec_date < date.fromisoformat(date_from):
-                        continue
-                    if date_to and rec_date > date.fromisoformat(date_to):
-                        continue
-                except ValueError:
-                    pass
-
-            # Product / title search
-            if product:
-                haystack = (
-                    (r.get("Product") or "") + " " + (r.get("Title") or "")
-                ).lower()
-                if product.lower() not in haystack:
-                    continue
-
-            # Category filter (multi-category records use " - " separator)
-            if category:
-                if category.lower() not in (r.get("Category") or "").lower():
-                    continue
-
-            # Recall class filter
-            if recall_class:
-                if recall_class != (r.get("Recall class") or "").strip():
-                    continue
-
-            # Issue / hazard filter
-            if issue:
-                if issue.lower() not in (r.get("Issue") or "").lower():
-                    continue
-
-            results.append(r)
-
-        if not results:
-            return pd.DataFrame()
-
-        df = pd.DataFrame(results)
-
-        # Normalise columns
-        df = df.rename(columns={
-            "NID":           "recall_id",
-            "Title":         "title",
-            "URL":           "url",
-            "Organization":  "organization",
-            "Product":       "product",
-            "Issue":         "issue",
-            "What you should do": "action",
-            "Category":      "category",
-            "Recall class":  "recall_class",
-            "Last updated":  "last_updated",
-            "Archived":      "archived",
-        })
-
-        # Sort: most severe class first, then most recent
-        df["_class_order"] = df["recall_class"].map(
-            lambda x: RECALL_CLASS_ORDER.get(x, 3)
+        return self.index().search(
+            product=product,
+            category=category,
+            recall_class=recall_class,
+            issue=issue,
+            date_from=date_from,
+            date_to=date_to,
+            include_archived=include_archived,
         )
-        df["last_updated"] = pd.to_datetime(df["last_updated"], errors="coerce")
-        df = df.sort_values(
-            ["_class_order", "last_updated"], ascending=[True, False]
-        ).drop(columns=["_class_order"])
-
-        return df.reset_index(drop=True)
 
     # ── Stats helpers ──────────────────────────────────────────────────────────
 
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Columnar index over Health Canada medical device recalls
+Built once per download of the bulk feed so each search is a handful of
+vectorized mask operations instead of a Python scan over every record.
+"""
+
+import os
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Raw feed keys -> DataFrame columns returned by search
+COLUMN_NAMES = {
+    "NID":           "recall_id",
+    "Title":         "title",
+    "URL":           "url",
+    "Organization":  "organization",
+    "Product":       "product",
+    "Issue":         "issue",
+    "What you should do": "action",
+    "Category":      "category",
+    "Recall class":  "recall_class",
+    "Last updated":  "last_updated",
+    "Archived":      "archived",
+}
+
+# Recall class severity order (Type I = most severe)
+RECALL_CLASS_ORDER = {"Type I": 0, "Type II": 1, "Type III": 2, "": 3}
+
+# Bump when the saved layout changes; older snapshots are then rebuilt
+INDEX_SCHEMA_VERSION = "1"
+
+# Derived columns saved alongside the frame: attribute -> column name
+_DERIVED = {
+    "archived": "__archived",
+    "updated": "__updated",
+    "product_text": "__product_text",
+    "issue_text": "__issue_text",
+    "category_text": "__category_text",
+    "recall_class": "__recall_class",
+}
+
+
+def _parse_date(value) -> np.datetime64:
+    # Missing or malformed dates never filter a record out, as in the row scan
+    try:
+        return np.datetime64(date.fromisoformat(value), "D")
+    except (TypeError, ValueError):
+        return np.datetime64("NaT", "D")
+
+
+_EMPTY = np.array([], dtype=np.int32)
+
+
+def build_trigrams(texts: list[str]) -> dict[str, np.ndarray]:
+    """Inverted index: each 3-character substring -> sorted row numbers containing it."""
+    postings = defaultdict(list)
+    for row, text in enumerate(texts):
+        for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+            postings[gram].append(row)
+    return {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+
+def trigram_candidates(postings: dict[str, np.ndarray], needle: str) -> np.ndarray | None:
+    """
+    Rows that contain every trigram of `needle` (a superset of the rows
+    containing `needle`), or None when the needle is too short to narrow.
+    """
+    grams = {needle[i:i + 3] for i in range(len(needle) - 2)}
+    if not grams:
+        return None
+    lists = sorted((postings.get(g, _EMPTY) for g in grams), key=len)
+    rows = lists[0]
+    for other in lists[1:]:
+        if not len(rows):
+            break
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
+
+
+class RecallIndex:
+    """
+    Search-ready view of the medical device recalls.
+
+    Rows are stored already sorted by severity, then most recent update
+    (the order search returns), so a filter is a boolean mask over
+    pre-parsed, pre-lowercased columns and the result needs no re-sort.
+    Masks for category and recall class values are computed once and kept.
+    """
+
+    def __init__(self, records: list[dict]):
+        self.frame = pd.DataFrame()
+        self._masks: dict[tuple[str, str], np.ndarray] = {}
+        self.size = 0
+        if not records:
+            return
+
+        df = pd.DataFrame(records).rename(columns=COLUMN_NAMES)
+        class_order = df.get("recall_class", pd.Series("", index=df.index)).map(
+            lambda x: RECALL_CLASS_ORDER.get(x, 3)
+        )
+        df["last_updated"] = pd.to_datetime(df["last_updated"], errors="coerce")
+        order = (
+            pd.DataFrame({"c": class_order, "d": df["last_updated"]})
+            .sort_values(["c", "d"], ascending=[True, False], kind="stable")
+            .index.to_numpy()
+        )
+        self.frame = df.iloc[order].reset_index(drop=True)
+        records = [records[i] for i in order]
+        self.size = len(records)
+
+        self.archived = np.array([r.get("Archived", "0") == "1" for r in records])
+        self.updated = np.array([_parse_date(r.get("Last updated", "")) for r in records])
+        self.undated = np.isnat(self.updated)
+        self.product_text = [
+            ((r.get("Product") or "") + " " + (r.get("Title") or "")).lower() for r in records
+        ]
+        self.issue_text = [(r.get("Issue") or "").lower() for r in records]
+        self.product_grams = build_trigrams(self.product_text)
+        self.issue_grams = build_trigrams(self.issue_text)
+        self.category_text = [(r.get("Category") or "").lower() for r in records]
+        self.recall_class = np.array([(r.get("Recall class") or "").strip() for r in records])
+
+    # ── Snapshot ──────────────────────────────────────────────────────────────
+
+    def save(self, directory: str | Path, source: str = ""):
+        """
+        Write the index as uncompressed Arrow IPC files in `directory` so it
+        can be memory-mapped by `load`. `source` identifies the download it
+        was built from and is handed back by `load`.
+        """
+        if not self.size:
+            return
+        directory = Path(directory)
+        metadata = {"schema_version": INDEX_SCHEMA_VERSION, "source": source}
+        table = pa.Table.from_pandas(self.frame, preserve_index=False)
+        for attr, column in _DERIVED.items():
+            table = table.append_column(column, pa.array(getattr(self, attr), from_pandas=True))
+        grams = {"product": self.product_grams, "issue": self.issue_grams}
+        postings = pa.table({
+            "field": [f for f, p in grams.items() for _ in p],
+            "gram": [g for p in grams.values() for g in p],
+            "rows": pa.array([r for p in grams.values() for r in p.values()],
+                             type=pa.list_(pa.int32())),
+        })
+        _write_ipc(table.replace_schema_metadata(metadata), directory / "recall_index.arrow")
+        _write_ipc(postings.replace_schema_metadata(metadata), directory / "recall_trigrams.arrow")
+
+    @classmethod
+    def load(cls, directory: str | Path) -> tuple["RecallIndex", str] | None:
+        """
+        Memory-map an index written by `save`.
+
+        Returns (index, source), or None if there is no snapshot or it was
+        written with a different schema version.
+        """
+        directory = Path(directory)
+        try:
+            table = _read_ipc(directory / "recall_index.arrow")
+            postings = _read_ipc(directory / "recall_trigrams.arrow")
+        except (OSError, pa.ArrowInvalid):
+            return None
+        metadata = table.schema.metadata or {}
+        if metadata.get(b"schema_version") != INDEX_SCHEMA_VERSION.encode():
+            return None
+
+        index = cls([])
+        index.frame = table.drop_columns(list(_DERIVED.values())).to_pandas()
+        index.size = table.num_rows
+        for attr, column in _DERIVED.items():
+            values = table.column(column)
+            setattr(index, attr, values.to_pylist() if attr.endswith("_text")
+                    else values.to_numpy(zero_copy_only=False))
+        index.updated = index.updated.astype("datetime64[D]")
+        index.undated = np.isnat(index.updated)
+        for field in ("product", "issue"):
+            rows = postings.filter(pc.equal(postings.column("field"), field))
+            lists = rows.column("rows").combine_chunks()
+            offsets, values = lists.offsets.to_numpy(), lists.values.to_numpy()
+            lists = np.split(values, offsets[1:-1]) if len(offsets) > 1 else []
+            setattr(index, f"{field}_grams", dict(zip(rows.column("gram").to_pylist(), lists)))
+        return index, metadata.get(b"source", b"").decode()
+
+    # ── Masks ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _contains(texts: list[str], needle: str) -> np.ndarray:
+        return np.fromiter((needle in t for t in texts), dtype=bool, count=len(texts))
+
+    def category_mask(self, category: str) -> np.ndarray:
+        key = ("category", category.lower())
+        if key not in self._masks:
+            self._masks[key] = self._contains(self.category_text, key[1])
+        return self._masks[key]
+
+    def class_mask(self, recall_class: str) -> np.ndarray:
+        key = ("class", recall_class)
+        if key not in self._masks:
+            self._masks[key] = self.recall_class == recall_class
+        return self._masks[key]
+
+    # ── Search ────────────────────────────────────────────────────────────────
+
+    def mask(
+        self,
+        product: str = "",
+        category: str = "",
+        recall_class: str = "",
+        issue: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        include_archived: bool = False,
+    ) -> np.ndarray:
+        """Boolean mask of the rows matching every given filter."""
+        keep = np.ones(self.size, dtype=bool)
+        if not include_archived:
+            keep &= ~self.archived
+        if date_from:
+            keep &= self.undated | (self.updated >= np.datetime64(date.fromisoformat(date_from), "D"))
+        if date_to:
+            keep &= self.undated | (self.updated <= np.datetime64(date.fromisoformat(date_to), "D"))
+        if category:
+            keep &= self.category_mask(category)
+        if recall_class:
+            keep &= self.class_mask(recall_class)
+        # Substring filters: the trigram index narrows the rows still in play
+        # to candidates, which are then checked for the actual substring
+        for needle, texts, grams in (
+            (product, self.product_text, self.product_grams),
+            (issue, self.issue_text, self.issue_grams),
+        ):
+            if needle and keep.any():
+                needle = needle.lower()
+                rows = trigram_candidates(grams, needle)
+                rows = np.flatnonzero(keep) if rows is None else rows[keep[rows]]
+                matched = np.zeros(self.size, dtype=bool)
+                matched[rows] = [needle in texts[i] for i in rows]
+                keep &= matched
+        return keep
+
+    def search(self, **filters) -> pd.DataFrame:
+        """Matching recalls, most severe class first, then most recent."""
+        if not self.size:
+            return pd.DataFrame()
+        keep = self.mask(**filters)
+        if not keep.any():
+            return pd.DataFrame()
+        return self.frame[keep].reset_index(drop=True)
+
+
+def _write_ipc(table: pa.Table, path: Path):
+    tmp = path.with_suffix(".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _read_ipc(path: Path) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(str(path))).read_all()
@@ -5,27 +5,395 @@ Fetch and parse medical device adverse event data from FDA's openFDA API
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import random
+import re
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import time
 
+from rate_limit import RateLimiter, QuotaExceeded
+
+# Matches the date_received range clause produced by build_query in maude_ui.py
+DATE_RANGE_RE = re.compile(r'date_received:\[(\d{8})\+TO\+(\d{8})\]')
+
+# Top-level report fields extracted by parse_to_dataframe (column, API key)
+REPORT_FIELDS = [
+    ('report_number', 'report_number'),
+    ('event_type', 'event_type'),
+    ('date_received', 'date_received'),
+    ('date_of_event', 'date_of_event'),
+    ('report_source_code', 'report_source_code'),
+    ('manufacturer_contact_country', 'manufacturer_contact_t_country'),
+]
+
+# Fields of the first device (column, API key); device_class comes from the
+# device's openfda block
+DEVICE_FIELDS = [
+    ('device_brand_name', 'brand_name'),
+    ('device_generic_name', 'generic_name'),
+    ('device_manufacturer', 'manufacturer_d_name'),
+    ('device_class', 'openfda'),
+    ('device_name', 'device_name'),
+]
+
+# mdr_text entries joined into event_description
+NARRATIVE_TYPES = ('Description of Event', 'Additional Manufacturer Narrative')
+
+# Every column parse_to_dataframe can produce, in output order
+PARSED_COLUMNS = (
+    [name for name, _ in REPORT_FIELDS]
+    + [name for name, _ in DEVICE_FIELDS]
+    + ['patient_sequence_number', 'outcome', 'event_description']
+)
+
+# Earliest date_received in the openFDA device event dataset; open-ended
+# ranges (19000101 / 99991231) are clamped to this and to today when sharding
+MAUDE_START_DATE = date(1991, 1, 1)
+
+
+def with_date_range(search_query, start, end):
+    """
+    Return `search_query` restricted to date_received between two dates
+    
+    An existing date_received range clause is replaced; otherwise one is
+    prepended with +AND+.
+    """
+    clause = f"date_received:[{start.strftime('%Y%m%d')}+TO+{end.strftime('%Y%m%d')}]"
+    if DATE_RANGE_RE.search(search_query):
+        return DATE_RANGE_RE.sub(lambda _: clause, search_query, count=1)
+    return f"{clause}+AND+{search_query}"
+
+
+def shard_date_bounds(search_query):
+    """
+    The (start, end) dates of a query's date_received range, clamped to the
+    dataset's coverage, or None if the query has no range
+    """
+    match = DATE_RANGE_RE.search(search_query)
+    if not match:
+        return None
+    start = max(datetime.strptime(match.group(1), '%Y%m%d').date(), MAUDE_START_DATE)
+    end = min(datetime.strptime(match.group(2), '%Y%m%d').date(), date.today())
+    return start, end
+
+
+def split_shards(pending, queries, totals, max_shard_size, shards):
+    """
+    One bisection round of shard planning
+    
+    Ranges whose probed total fits are appended to `shards` as
+    (start, query, total); the rest are halved and returned for the next
+    round of probes. Empty ranges are dropped.
+    """
+    next_pending = []
+    for (a, b), q, total in zip(pending, queries, totals):
+        if total == 0:
+            continue
+        if total is not None and total <= max_shard_size:
+            shards.append((a, q, total))
+        elif a == b:
+            if total is None:
+                print(f"Skipping {a}: the query fails even for a single day")
+            else:
+                print(f"{a} alone has {total} reports; only the first "
+                      f"{max_shard_size} can be fetched")
+                shards.append((a, q, total))
+        else:
+            mid = a + (b - a) // 2
+            next_pending += [(a, mid), (mid + timedelta(days=1), b)]
+    return next_pending
+
+
+def prune_pending(pending, shards, probed, max_results, shard_cap):
+    """
+    Drop pending ranges that select_shards would never reach
+    
+    `probed` holds this round's ((start, end), total) probes; a range that
+    was split still covers at least min(total, shard_cap) reports between
+    its start and end. Once the shards and split ranges up to some date
+    cover `max_results`, ranges starting after it are not planned.
+    """
+    if not max_results:
+        return pending
+    spans = [(start, start, min(total, shard_cap)) for start, _, total in shards]
+    planned = {start for start, _, _ in shards}
+    spans += [(a, b, min(total, shard_cap)) for (a, b), total in probed if total and a not in planned]
+    covered = 0
+    for _, end, total in sorted(spans):
+        covered += total
+        if covered >= max_results:
+            return [(a, b) for a, b in pending if a <= end]
+    return pending
+
+
+def finish_plan(shards):
+    """Order planned shards chronologically as (query, total) tuples"""
+    shards.sort(key=lambda shard: shard[0])
+    print(f"Planned {len(shards)} shard(s) for {sum(t for _, _, t in shards)} reports")
+    return [(q, total) for _, q, total in shards]
+
+
+def select_shards(shards, max_results, shard_cap):
+    """Pick shards in order, with per-shard caps, until max_results is covered"""
+    selected = []
+    remaining = max_results
+    for query, total in shards:
+        if remaining is not None and remaining <= 0:
+            break
+        cap = min(total, shard_cap)
+        if remaining is not None:
+            cap = min(cap, remaining)
+            remaining -= cap
+        selected.append((query, cap))
+    return selected
+
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delay or HTTP date), if any"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class ProbeFailed(RuntimeError):
+    """A count probe failed for a reason other than the query being too broad"""
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter for transient openFDA failures"""
+    
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    
+    def __init__(self, max_retries=4, backoff_base=1.0, backoff_max=60.0, jitter=True,
+                 retry_statuses=RETRY_STATUSES):
+        """
+        Args:
+            max_retries (int): Retry budget per request (page)
+            backoff_base (float): Delay before the first retry in seconds;
+                doubles with every further attempt
+            backoff_max (float): Upper bound on a single backoff delay
+            jitter (bool): Randomize delays ("full jitter") so concurrent
+                workers don't retry in lockstep
+            retry_statuses (tuple): HTTP status codes worth retrying
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = tuple(retry_statuses)
+    
+    def backoff(self, attempt, retry_after=None):
+        """
+        Seconds to wait before retry number `attempt` (0-based), or None
+        when the server's Retry-After is longer than `backoff_max` and the
+        request should be given up rather than block the caller
+        """
+        if retry_after is not None:
+            return retry_after if retry_after <= self.backoff_max else None
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+class PaginationCursor:
+    """
+    Progress of a paginated fetch
+    
+    Pass the same cursor to `fetch_all` again (or save it and load it in a
+    later run) to fetch only the pages that are still missing.
+    """
+    
+    def __init__(self, search_query, max_results=None, page_size=1000, max_skip=25000):
+        self.search_query = search_query
+        self.max_results = max_results
+        self.page_size = page_size
+        self.max_skip = max_skip
+        self.total = None
+        self.pages = {}  # skip -> list of results
+    
+    @property
+    def target(self):
+        """Number of results this fetch aims for, or None before the first page"""
+        if self.total is None:
+            return None
+        target = min(self.total, self.max_skip + self.page_size)
+        return min(target, self.max_results) if self.max_results else target
+    
+    def pending_skips(self):
+        if self.total is None:
+            return [0]
+        return [skip for skip in range(0, self.target, self.page_size) if skip not in self.pages]
+    
+    @property
+    def complete(self):
+        return self.total is not None and not self.pending_skips()
+    
+    @property
+    def results(self):
+        """Results of the pages fetched so far, in order and without gaps"""
+        all_results = []
+        skip = 0
+        while skip in self.pages:
+            all_results.extend(self.pages[skip])
+            skip += self.page_size
+        return all_results[:self.target] if self.total is not None else all_results
+    
+    def to_dict(self):
+        return {
+            'search_query': self.search_query,
+            'max_results': self.max_results,
+            'page_size': self.page_size,
+            'max_skip': self.max_skip,
+            'total': self.total,
+            'pages': {str(skip): page for skip, page in self.pages.items()},
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        cursor = cls(data['search_query'], data['max_results'], data['page_size'], data['max_skip'])
+        cursor.total = data['total']
+        cursor.pages = {int(skip): page for skip, page in data['pages'].items()}
+        return cursor
+    
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f)
+    
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            return cls.from_dict(json.load(f))
+
+
+def dedupe_results(results):
+    """Drop repeated reports by report_number, keeping first occurrences"""
+    seen = set()
+    unique = []
+    for result in results:
+        key = result.get('report_number')
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        unique.append(result)
+    return unique
+
+
 class MAUDEFetcher:
     """Class to fetch and parse MAUDE data from openFDA API"""
     
     BASE_URL = "https://api.fda.gov/device/event.json"
+    PAGE_SIZE = 1000  # Maximum results per request
+    MAX_SKIP = 25000  # openFDA rejects skip values above this
+    
+    # Concurrency caps for parallel paging. Request pacing is handled by the
+    # rate limiter; unkeyed access only gets 1,000 requests per day, so keep
+    # its fan-out gentle.
+    MAX_WORKERS_WITH_KEY = 4
+    MAX_WORKERS_NO_KEY = 2
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, cache=None, rate_limiter=None, retry_policy=None):
         """
         Initialize the fetcher
         
         Args:
             api_key (str, optional): FDA API key for higher rate limits
+            cache (ResponseCache, optional): On-disk cache that serves repeat
+                queries without hitting the API
+            rate_limiter (RateLimiter, optional): Token bucket pacing requests.
+                Defaults to the limiter shared by every fetcher using the same
+                API key.
+            retry_policy (RetryPolicy, optional): Backoff for 429/5xx responses
+                and connection errors
         """
         self.api_key = api_key
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter.for_key(api_key)
+        self.retry_policy = retry_policy or RetryPolicy()
         self.session = requests.Session()
+        # Size the connection pool so concurrent page fetches can reuse sockets
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+    
+    @property
+    def max_workers(self):
+        """Upper bound on concurrent requests for the configured API key"""
+        return self.MAX_WORKERS_WITH_KEY if self.api_key else self.MAX_WORKERS_NO_KEY
+    
+    def _build_url(self, search_query, limit, skip, sort=None):
+        # Build URL manually to avoid over-encoding
+        # FDA API is sensitive to how brackets and + signs are encoded
+        url = f"{self.BASE_URL}?search={search_query}&limit={min(limit, 1000)}&skip={skip}"
+        if sort:
+            url += f"&sort={sort}"
+        
+        if self.api_key:
+            url += f"&api_key={self.api_key}"
+        return url
     
-    def search(self, search_query, limit=100, skip=0):
+    def _get(self, url):
+        """Send a rate-limited GET and report throttling back to the limiter"""
+        self.rate_limiter.acquire()
+        response = self.session.get(url, timeout=30)
+        if response.status_code == 429:
+            # Requests given up on a longer Retry-After must not leave every
+            # other caller paused for it
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                retry_after = min(retry_after, self.retry_policy.backoff_max)
+            self.rate_limiter.on_throttled(retry_after)
+        elif response.ok:
+            self.rate_limiter.on_success()
+        return response
+    
+    def _request(self, url, retry_statuses=None, max_retries=None):
+        """
+        GET with retries per `self.retry_policy`
+        
+        Returns the last response once it succeeds, fails permanently or the
+        retry budget runs out. Connection errors are re-raised when the budget
+        runs out. `max_retries` overrides the policy's budget.
+        """
+        policy = self.retry_policy
+        if retry_statuses is None:
+            retry_statuses = policy.retry_statuses
+        if max_retries is None:
+            max_retries = policy.max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                response = self._get(url)
+            except requests.exceptions.RequestException as e:
+                if attempt == max_retries:
+                    raise
+                wait = policy.backoff(attempt)
+                print(f"Request failed ({e}); retrying in {wait:.1f}s "
+                      f"(attempt {attempt + 1} of {max_retries})")
+            else:
+                if response.status_code not in retry_statuses or attempt == max_retries:
+                    return response
+                wait = policy.backoff(attempt, retry_after_seconds(response))
+                if wait is None:
+                    print(f"HTTP {response.status_code}; Retry-After exceeds "
+                          f"{policy.backoff_max:g}s, giving up")
+                    return response
+                print(f"HTTP {response.status_code}; retrying in {wait:.1f}s "
+                      f"(attempt {attempt + 1} of {max_retries})")
+            time.sleep(wait)
+    
+    def search(self, search_query, limit=100, skip=0, sort=None):
         """
         Search MAUDE database
         
@@ -33,24 +401,31 @@ class MAUDEFetcher:
             search_query (str): Search query (e.g., 'device.generic_name:"pacemaker"')
             limit (int): Number of results to return (max 1000)
             skip (int): Number of results to skip (for pagination)
+            sort (str, optional): Result order, e.g. 'date_received:asc'
             
         Returns:
             dict: API response with results
         """
-        # Build URL manually to avoid over-encoding
-        # FDA API is sensitive to how brackets and + signs are encoded
-        url = f"{self.BASE_URL}?search={search_query}&limit={min(limit, 1000)}&skip={skip}"
+        limit = min(limit, 1000)
+        extra = {'sort': sort} if sort else {}
+        if self.cache is not None:
+            cached = self.cache.get(search_query, limit, skip, **extra)
+            if cached is not None:
+                print(f"Cache hit: {search_query} (skip={skip})")
+                return cached
         
-        if self.api_key:
-            url += f"&api_key={self.api_key}"
+        url = self._build_url(search_query, limit, skip, sort)
         
         print(f"Query: {search_query}")
         print(f"URL: {url}")
         
         try:
-            response = self.session.get(url, timeout=30)
+            response = self._request(url)
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+            if self.cache is not None:
+                self.cache.put(search_query, limit, skip, data, **extra)
+            return data
         except requests.exceptions.HTTPError as e:
             if response.status_code == 500:
                 print(f"HTTP Error 500: {e}")
@@ -58,115 +433,449 @@ class MAUDEFetcher:
                 print(f"Server error (500). Try:")
                 print("  1. Narrowing your date range")
                 print("  2. Adding a device type to your query")
-                print(f"  3. Your query was: {search_query}")
+                print("  3. Using fetch_sharded to split the date range automatically")
+                print(f"  4. Your query was: {search_query}")
             elif response.status_code == 404:
                 print(f"No results found for query: {search_query}")
+            elif response.status_code == 429:
+                print("Rate limited by openFDA (429); slowing down")
             else:
                 print(f"HTTP Error {response.status_code}: {e}")
             return None
+        except QuotaExceeded as e:
+            print(f"{e}; try again tomorrow or configure an API key")
+            return None
         except requests.exceptions.RequestException as e:
             print(f"Error fetching data: {e}")
             return None
     
-    def fetch_all(self, search_query, max_results=None, delay=0.5):
+    def fetch_all(self, search_query, max_results=None, delay=0, workers=1, cursor=None,
+                  sort=None, progress=None):
         """
         Fetch all results for a query (handles pagination automatically)
         
         Args:
             search_query (str): Search query
             max_results (int, optional): Maximum number of results to fetch
-            delay (float): Delay between requests in seconds (to respect rate limits)
+            delay (float): Extra pause between pages in seconds. Requests are
+                already paced by the shared rate limiter, so this is rarely needed
+            workers (int): Number of pages to fetch in parallel. The default
+                of 1 pages sequentially; higher values are capped at
+                `max_workers` for the configured API key.
+            cursor (PaginationCursor, optional): Progress of an earlier,
+                interrupted fetch of the same query. Only missing pages are
+                fetched, and the cursor is updated in place.
+            sort (str, optional): Result order, e.g. 'date_received:asc'.
+                With a sort, a capped fetch returns a well-defined prefix.
+            progress (callable, optional): Called as progress(fetched, expected)
+                after every page; may be called from worker threads
             
         Returns:
-            list: All results
+            list: All results (up to the first page that could not be fetched)
         """
-        all_results = []
-        skip = 0
-        limit = 1000  # Maximum per request
+        limit = self.PAGE_SIZE
+        if cursor is None:
+            cursor = PaginationCursor(search_query, max_results, limit, self.MAX_SKIP)
+        workers = max(1, min(workers or 1, self.max_workers))
         
-        print(f"Fetching data for query: {search_query}")
+        print(f"Fetching data for query: {search_query}"
+              + (f" ({workers} workers)" if workers > 1 else ""))
         
-        while True:
+        def fetch_page(skip):
             print(f"Fetching results {skip} to {skip + limit}...")
-            
-            data = self.search(search_query, limit=limit, skip=skip)
-            
+            page_limit = limit if cursor.target is None else min(limit, cursor.target - skip)
+            data = self.search(search_query, limit=page_limit, skip=skip, sort=sort)
+            if delay:
+                time.sleep(delay)
             if not data or 'results' not in data:
-                break
+                return False
+            if cursor.total is None:
+                cursor.total = data['meta']['results']['total']
+            cursor.pages[skip] = data['results']
+            if progress:
+                progress(sum(len(page) for page in list(cursor.pages.values())), cursor.target)
+            return True
+        
+        # The first page tells us how many pages there are
+        if cursor.total is None and not fetch_page(0):
+            print("Total results fetched: 0")
+            return cursor.results
+        
+        total_available = cursor.total
+        if cursor.target < min(total_available, max_results or total_available):
+            print(f"Reached the openFDA skip limit ({self.MAX_SKIP}); "
+                  "use fetch_sharded to page past it")
+        
+        pending = cursor.pending_skips()
+        if workers > 1:
+            # Pages may finish out of order; the cursor reassembles them
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(fetch_page, pending))
+        else:
+            for skip in pending:
+                if not fetch_page(skip):
+                    break
+                print(f"Retrieved {len(cursor.results)} of {total_available} total results")
+        
+        all_results = cursor.results
+        if not cursor.complete:
+            print(f"Fetch incomplete: got {len(all_results)} of {cursor.target} results. "
+                  "Pass a PaginationCursor to fetch_all to resume.")
+        print(f"Total results fetched: {len(all_results)}")
+        return all_results
+    
+    def iter_pages(self, search_query, max_results=None, sort=None, skip=0):
+        """
+        Yield each page of results as it arrives, keeping nothing afterwards
+        
+        Args:
+            search_query (str): Search query
+            max_results (int, optional): Maximum number of results to fetch
+            sort (str, optional): Result order, e.g. 'date_received:asc'
+            skip (int): Results to skip before the first page
             
-            results = data['results']
-            all_results.extend(results)
+        Yields:
+            list: Results of one page (up to PAGE_SIZE reports)
+        """
+        limit = self.PAGE_SIZE
+        target = None
+        while target is None or skip < target:
+            page_limit = limit if target is None else min(limit, target - skip)
+            data = self.search(search_query, limit=page_limit, skip=skip, sort=sort)
+            if not data or 'results' not in data:
+                if target is not None:
+                    print(f"Fetch incomplete: stopped at {skip} of {target} results")
+                return
+            if target is None:
+                total = data['meta']['results']['total']
+                target = min(total, self.MAX_SKIP + limit)
+                if max_results:
+                    target = min(target, skip + max_results)
+            yield data['results'][:target - skip]
+            skip += limit
+    
+    def fetch_to_parquet(self, search_query, path, max_results=None):
+        """
+        Stream a query straight into a Parquet file
+        
+        Each page is parsed and written as its own row group as soon as it
+        arrives, so memory stays around one page however large the query.
+        Every column of `parse_to_dataframe` is written as a nullable string,
+        giving all row groups the same schema.
+        
+        Args:
+            search_query (str): Search query
+            path (str): Output .parquet file
+            max_results (int, optional): Maximum number of results to fetch
             
-            # Check if we've reached the end or max_results
-            total_available = data['meta']['results']['total']
-            print(f"Retrieved {len(all_results)} of {total_available} total results")
+        Returns:
+            int: Number of rows written
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        schema = pa.schema([(name, pa.string()) for name in PARSED_COLUMNS])
+        rows = 0
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            for page in self.iter_pages(search_query, max_results=max_results):
+                df = self.parse_to_dataframe(page)
+                columns = [
+                    pa.array(df[name], type=pa.string(), from_pandas=True)
+                    if name in df.columns else pa.nulls(len(df), pa.string())
+                    for name in PARSED_COLUMNS
+                ]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                rows += len(df)
+                print(f"Wrote {rows} rows to {path}")
+        return rows
+    
+    def probe_total(self, search_query):
+        """
+        Cheaply count the reports matching a query with a limit=1 request
+        
+        Returns:
+            int: Matching reports (0 if none), or None if the request failed
+                (e.g. a 500 for an overly broad query)
+        """
+        try:
+            return self._probe(search_query)
+        except ProbeFailed as e:
+            print(e)
+            return None
+    
+    def _probe(self, search_query):
+        """
+        probe_total for the shard planner
+        
+        Returns None only for a 500, which openFDA gives for overly broad
+        queries. Any other failure (network, quota, a 429 out of retries)
+        raises ProbeFailed, since splitting the range would only repeat it.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(search_query, 1, 0)
+            if cached is not None:
+                return cached['meta']['results']['total']
+        
+        # A 500 on a probe means "too broad" to the planner, so don't retry it
+        statuses = [code for code in self.retry_policy.retry_statuses if code != 500]
+        try:
+            response = self._request(self._build_url(search_query, 1, 0), retry_statuses=statuses)
+        except (QuotaExceeded, requests.exceptions.RequestException) as e:
+            raise ProbeFailed(f"Error probing query: {e}") from e
+        if response.status_code == 404:
+            return 0
+        if response.status_code == 500:
+            return None
+        if not response.ok:
+            raise ProbeFailed(f"Error probing query: HTTP {response.status_code}")
+        data = response.json()
+        if self.cache is not None:
+            self.cache.put(search_query, 1, 0, data)
+        return data['meta']['results']['total']
+    
+    def count(self, search_query, field, limit=1000, max_retries=None):
+        """
+        Tally matching reports by the values of one field, server-side
+    
+        One request covers every matching report, however many there are.
+    
+        Args:
+            search_query (str): Search query, as produced by build_query
+            field (str): Field to count, e.g. 'event_type' or
+                'device.manufacturer_d_name.exact' (use .exact for whole
+                phrases); date fields such as 'date_received' count per day
+            limit (int): Most frequent terms to return (max 1000; ignored by
+                the API for date fields, which return every day)
+            max_retries (int, optional): Retry budget, overriding
+                `retry_policy.max_retries` (0 for a quick answer or none)
+    
+        Returns:
+            list: [{'term': ..., 'count': ...}] most frequent first ([] if
+            nothing matches), or None if the request failed
+        """
+        limit = min(limit, 1000)
+        if self.cache is not None:
+            cached = self.cache.get(search_query, limit, 0, count=field)
+            if cached is not None:
+                print(f"Cache hit: count {field} for {search_query}")
+                return cached['results']
+    
+        url = f"{self.BASE_URL}?search={search_query}&count={field}&limit={limit}"
+        if self.api_key:
+            url += f"&api_key={self.api_key}"
+    
+        try:
+            response = self._request(url, max_retries=max_retries)
+        except (QuotaExceeded, requests.exceptions.RequestException) as e:
+            print(f"Error counting {field}: {e}")
+            return None
+        if response.status_code == 404:
+            return []
+        if not response.ok:
+            print(f"HTTP Error {response.status_code} counting {field}")
+            return None
+        # Date fields come back as {'time': 'YYYYMMDD', 'count': n}
+        data = {'results': [
+            {'term': r.get('term', r.get('time')), 'count': r['count']}
+            for r in response.json().get('results', [])
+        ]}
+        if self.cache is not None:
+            self.cache.put(search_query, limit, 0, data, count=field)
+        return data['results']
+    
+    def plan_shards(self, search_query, max_shard_size=None, workers=None, max_results=None):
+        """
+        Split a query into date_received shards small enough to page through
+        
+        The query's date range is bisected until every shard's count probe
+        fits within `max_shard_size` (defaults to the skip ceiling). Ranges
+        whose probe gets a 500 are split as well, since broad date ranges are
+        the usual cause of openFDA 500 errors. With `max_results`, ranges are
+        probed earliest first and those later than the shards needed to
+        cover it are left unplanned.
+        
+        Args:
+            search_query (str): Search query, as produced by build_query
+            max_shard_size (int, optional): Maximum reports per shard
+            workers (int, optional): Concurrent probes (capped at `max_workers`)
+            max_results (int, optional): Results the caller will fetch
             
-            if len(results) < limit or (max_results and len(all_results) >= max_results):
-                break
+        Returns:
+            list: (query, total) tuples in chronological order
             
-            skip += limit
+        Raises:
+            ProbeFailed: A probe failed other than with a 500
+        """
+        max_shard_size = max_shard_size or self.MAX_SKIP
+        workers = min(workers or self.max_workers, self.max_workers)
+        
+        bounds = shard_date_bounds(search_query)
+        if not bounds:
+            total = self._probe(search_query)
+            if total is None:
+                print("Query has no date_received range to shard on; "
+                      "add one to split it into smaller requests")
+                return []
+            return [(search_query, total)] if total else []
+        
+        shards = []
+        pending = [bounds] if bounds[0] <= bounds[1] else []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending:
+                # For a prefix of the results, probe the earliest ranges first
+                # so later ones can be pruned before they are ever split
+                batch, later = (pending[:workers], pending[workers:]) if max_results else (pending, [])
+                queries = [with_date_range(search_query, a, b) for a, b in batch]
+                totals = list(pool.map(self._probe, queries))
+                probed = list(zip(batch, totals))
+                pending = split_shards(batch, queries, totals, max_shard_size, shards) + later
+                pending = prune_pending(pending, shards, probed, max_results, self.MAX_SKIP + self.PAGE_SIZE)
+        
+        return finish_plan(shards)
+    
+    def fetch_sharded(self, search_query, max_results=None, delay=0, workers=None, progress=None):
+        """
+        Fetch a large query by splitting it into date-range shards
+        
+        Shards from `plan_shards` are fetched in parallel and merged in
+        chronological order, dropping duplicate report numbers. This gets
+        past the skip ceiling and the 500 errors broad date ranges trigger.
+        
+        Args:
+            search_query (str): Search query
+            max_results (int, optional): Maximum number of results to fetch
+            delay (float): Extra pause between pages in seconds. Requests are
+                already paced by the shared rate limiter, so this is rarely needed
+            workers (int, optional): Shards to fetch in parallel (capped at `max_workers`)
+            progress (callable, optional): Called as progress(fetched, expected)
+                across all shards after every page; may be called from worker threads
             
-            if max_results and skip >= max_results:
-                break
+        Returns:
+            list: All results
             
-            # Rate limiting - be nice to the API
-            time.sleep(delay)
+        Raises:
+            ProbeFailed: Planning stopped because a probe failed other than
+                with a 500; nothing was fetched
+        """
+        workers = min(workers or self.max_workers, self.max_workers)
+        shard_cap = self.MAX_SKIP + self.PAGE_SIZE
         
-        print(f"Total results fetched: {len(all_results)}")
+        # A pull that fits under the skip ceiling needs no shards, unless the
+        # query is too broad for the API to answer at all
+        if max_results and max_results <= shard_cap:
+            total = self._probe(search_query)
+            if total == 0:
+                return []
+            if total is not None:
+                return self.fetch_all(search_query, max_results=max_results, delay=delay,
+                                      workers=workers, progress=progress)
+        
+        shards = self.plan_shards(search_query, workers=workers, max_results=max_results)
+        
+        selected = select_shards(shards, max_results, shard_cap)
+        
+        # Spread the worker budget: one shard pages concurrently on its own,
+        # many shards each page sequentially
+        page_workers = max(1, workers // max(len(selected), 1))
+        
+        expected = sum(cap for _, cap in selected)
+        fetched = {}
+        lock = threading.Lock()
+        
+        def shard_progress(index):
+            def report(count, _target):
+                with lock:
+                    fetched[index] = count
+                    total = sum(fetched.values())
+                progress(total, expected)
+            return report if progress else None
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pages = list(pool.map(
+                lambda index: self.fetch_all(selected[index][0], max_results=selected[index][1],
+                                             delay=delay, workers=page_workers,
+                                             progress=shard_progress(index)),
+                range(len(selected)),
+            ))
+        
+        all_results = dedupe_results([r for page in pages for r in page])
+        print(f"Total results fetched across {len(selected)} shard(s): {len(all_results)}")
         return all_results[:max_results] if max_results else all_results
     
     def parse_to_dataframe(self, results):
         """
         Parse results into a pandas DataFrame
         
+        A single column-builder pass pulls every field of a report into one
+        flat tuple, then the batch is transposed into columns at C speed and
+        handed to pandas as a dict of columns, which avoids building a dict
+        per report and pandas' slow list-of-dicts path. Reports lacking a
+        section (device, patient, outcome, narrative) get NaN there, and a
+        section's columns only appear if some report has it, in the order
+        DataFrame(records) would give.
+        
         Args:
             results (list): List of result objects from API
             
         Returns:
             pd.DataFrame: Parsed data
         """
-        parsed_data = []
-        
-        for result in results:
-            # Extract basic report info
-            row = {
-                'report_number': result.get('report_number'),
-                'event_type': result.get('event_type'),
-                'date_received': result.get('date_received'),
-                'date_of_event': result.get('date_of_event'),
-                'report_source_code': result.get('report_source_code'),
-                'manufacturer_contact_country': result.get('manufacturer_contact_t_country')
-            }
-            
-            # Extract device information (first device if multiple)
-            if 'device' in result and len(result['device']) > 0:
-                device = result['device'][0]
-                row['device_brand_name'] = device.get('brand_name')
-                row['device_generic_name'] = device.get('generic_name')
-                row['device_manufacturer'] = device.get('manufacturer_d_name')
-                row['device_class'] = device.get('openfda', {}).get('device_class')
-                row['device_name'] = device.get('device_name')
-            
-            # Extract patient information
-            if 'patient' in result and len(result['patient']) > 0:
-                patient = result['patient'][0]
-                row['patient_sequence_number'] = patient.get('patient_sequence_number')
-                
-                # Extract patient problems if available
-                if 'sequence_number_outcome' in patient:
-                    outcomes = patient['sequence_number_outcome']
-                    if outcomes:
-                        row['outcome'] = outcomes[0] if isinstance(outcomes, list) else outcomes
-            
-            # Extract event description (narrative text)
-            if 'mdr_text' in result:
-                texts = result['mdr_text']
-                descriptions = [t.get('text', '') for t in texts if t.get('text_type_code') in ['Description of Event', 'Additional Manufacturer Narrative']]
-                row['event_description'] = ' | '.join(descriptions) if descriptions else ''
-            
-            parsed_data.append(row)
+        if not results:
+            return pd.DataFrame()
+        
+        # Stand-ins for absent sections; their fields are all the `missing`
+        # NaN object, which also marks absence for the presence checks below
+        missing = float('nan')
+        no_device = {key: missing for _, key in DEVICE_FIELDS}
+        no_device['openfda'] = {'device_class': missing}
+        no_patient = {'patient_sequence_number': missing}
+        no_text = object()
+        
+        def fields(result):
+            # Keys are spelled out rather than looped over: this runs once per
+            # report and is the hot path for large pulls
+            get = result.get
+            devices = get('device')
+            device = devices[0] if devices else no_device
+            device_get = device.get
+            patients = get('patient')
+            patient = patients[0] if patients else no_patient
+            outcomes = patient.get('sequence_number_outcome')
+            texts = get('mdr_text', no_text)
+            return (
+                get('report_number'),
+                get('event_type'),
+                get('date_received'),
+                get('date_of_event'),
+                get('report_source_code'),
+                get('manufacturer_contact_t_country'),
+                device_get('brand_name'),
+                device_get('generic_name'),
+                device_get('manufacturer_d_name'),
+                device_get('openfda', {}).get('device_class'),
+                device_get('device_name'),
+                patient.get('patient_sequence_number'),
+                (outcomes[0] if isinstance(outcomes, list) else outcomes) if outcomes else missing,
+                missing if texts is no_text else ' | '.join(
+                    [t.get('text', '') for t in texts if t.get('text_type_code') in NARRATIVE_TYPES]
+                ),
+            )
+        
+        columns = dict(zip(PARSED_COLUMNS, zip(*map(fields, results))))
+        
+        def first_present(name):
+            return next((i for i, v in enumerate(columns[name]) if v is not missing), None)
         
-        return pd.DataFrame(parsed_data)
+        # Sections in per-report field order, each keyed by the first report having it
+        sections = [
+            (0, [name for name, _ in REPORT_FIELDS]),
+            (first_present('device_name'), [name for name, _ in DEVICE_FIELDS]),
+            (first_present('patient_sequence_number'), ['patient_sequence_number']),
+            (first_present('outcome'), ['outcome']),
+            (first_present('event_description'), ['event_description']),
+        ]
+        present = sorted((s for s in sections if s[0] is not None), key=lambda s: s[0])
+        return pd.DataFrame({name: columns[name] for _, names in present for name in names})
     
     def save_to_csv(self, df, filename):
         """Save DataFrame to CSV file"""
@@ -248,7 +957,7 @@ def example_4_fetch_and_save():
     
     # Fetch up to 500 insulin pump reports
     query = 'device.generic_name:"insulin+pump"'
-    results = fetcher.fetch_all(query, max_results=500, delay=0.5)
+    results = fetcher.fetch_all(query, max_results=500)
     
     if results:
         # Convert to DataFrame
@@ -317,7 +1026,6 @@ def example_7_working_queries():
             print(f"  ✓ Found {results['meta']['results']['total']} reports")
         else:
             print(f"  ✗ Query failed")
-        time.sleep(0.5)  # Be nice to the API
 
 
 if __name__ == "__main__":
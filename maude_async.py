@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Asyncio MAUDE client
+Same search / fetch_all / parse_to_dataframe surface as MAUDEFetcher, built
+on aiohttp so one event loop can drive many concurrent requests over a
+pooled set of connections.
+"""
+
+import asyncio
+
+import aiohttp
+from yarl import URL
+
+from maude_api_fetch import (
+    MAUDEFetcher, PaginationCursor, ProbeFailed, RetryPolicy, dedupe_results, finish_plan, prune_pending,
+    retry_after_seconds, select_shards, shard_date_bounds, split_shards, with_date_range,
+)
+from rate_limit import RateLimiter, QuotaExceeded
+
+
+class AsyncMAUDEFetcher:
+    """Asyncio counterpart of MAUDEFetcher"""
+
+    BASE_URL = MAUDEFetcher.BASE_URL
+    PAGE_SIZE = MAUDEFetcher.PAGE_SIZE
+    MAX_SKIP = MAUDEFetcher.MAX_SKIP
+
+    def __init__(self, api_key=None, cache=None, rate_limiter=None, retry_policy=None,
+                 max_connections=100, base_url=None):
+        """
+        Initialize the fetcher
+
+        Args:
+            api_key (str, optional): FDA API key for higher rate limits
+            cache (ResponseCache, optional): On-disk cache for repeat queries
+            rate_limiter (RateLimiter, optional): Defaults to the limiter
+                shared with every other fetcher using the same API key
+            retry_policy (RetryPolicy, optional): Backoff for transient failures
+            max_connections (int): Size of the connection pool, which also
+                bounds the number of requests in flight
+            base_url (str, optional): Endpoint override, e.g. a local stub
+                server replaying recorded pages (see openfda_stub.py)
+        """
+        self.api_key = api_key
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter.for_key(api_key)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.max_connections = max_connections
+        if base_url:
+            self.BASE_URL = base_url
+        self._session = None
+
+    # The URL format and the parsing/export helpers are shared with the sync client
+    _build_url = MAUDEFetcher._build_url
+    parse_to_dataframe = MAUDEFetcher.parse_to_dataframe
+    save_to_csv = MAUDEFetcher.save_to_csv
+    save_to_json = MAUDEFetcher.save_to_json
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _request(self, url, retry_statuses=None):
+        """
+        Rate-limited GET with retries per `self.retry_policy`
+
+        Returns (status, parsed JSON body or None).
+        """
+        policy = self.retry_policy
+        if retry_statuses is None:
+            retry_statuses = policy.retry_statuses
+        for attempt in range(policy.max_retries + 1):
+            await asyncio.sleep(self.rate_limiter.reserve())
+            try:
+                # encoded=True keeps brackets and + signs exactly as built
+                async with self.session.get(URL(url, encoded=True)) as response:
+                    status = response.status
+                    retry_after = retry_after_seconds(response)
+                    body = await response.json(content_type=None) if status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == policy.max_retries:
+                    raise
+                wait = policy.backoff(attempt)
+                print(f"Request failed ({e!r}); retrying in {wait:.1f}s "
+                      f"(attempt {attempt + 1} of {policy.max_retries})")
+            else:
+                if status == 429:
+                    self.rate_limiter.on_throttled(
+                        None if retry_after is None else min(retry_after, policy.backoff_max)
+                    )
+                elif status == 200:
+                    self.rate_limiter.on_success()
+                if status not in retry_statuses or attempt == policy.max_retries:
+                    return status, body
+                wait = policy.backoff(attempt, retry_after)
+                if wait is None:
+                    print(f"HTTP {status}; Retry-After exceeds {policy.backoff_max:g}s, giving up")
+                    return status, body
+                print(f"HTTP {status}; retrying in {wait:.1f}s "
+                      f"(attempt {attempt + 1} of {policy.max_retries})")
+            await asyncio.sleep(wait)
+
+    async def search(self, search_query, limit=100, skip=0):
+        """
+        Search MAUDE database
+
+        Args:
+            search_query (str): Search query (e.g., 'device.generic_name:"pacemaker"')
+            limit (int): Number of results to return (max 1000)
+            skip (int): Number of results to skip (for pagination)
+
+        Returns:
+            dict: API response with results, or None on failure
+        """
+        limit = min(limit, 1000)
+        if self.cache is not None:
+            cached = self.cache.get(search_query, limit, skip)
+            if cached is not None:
+                return cached
+
+        try:
+            status, data = await self._request(self._build_url(search_query, limit, skip))
+        except QuotaExceeded as e:
+            print(f"{e}; try again tomorrow or configure an API key")
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error fetching data: {e!r}")
+            return None
+
+        if status == 200:
+            if self.cache is not None:
+                self.cache.put(search_query, limit, skip, data)
+            return data
+        if status == 404:
+            print(f"No results found for query: {search_query}")
+        else:
+            print(f"HTTP Error {status} for query: {search_query}")
+        return None
+
+    async def fetch_all(self, search_query, max_results=None, concurrency=None, cursor=None):
+        """
+        Fetch all results for a query (handles pagination automatically)
+
+        Args:
+            search_query (str): Search query
+            max_results (int, optional): Maximum number of results to fetch
+            concurrency (int, optional): Pages in flight at once (defaults to
+                all remaining pages; the connection pool and rate limiter
+                still bound actual throughput)
+            cursor (PaginationCursor, optional): Progress of an earlier fetch
+                to resume
+
+        Returns:
+            list: All results (up to the first page that could not be fetched)
+        """
+        limit = self.PAGE_SIZE
+        if cursor is None:
+            cursor = PaginationCursor(search_query, max_results, limit, self.MAX_SKIP)
+
+        async def fetch_page(skip):
+            page_limit = limit if cursor.target is None else min(limit, cursor.target - skip)
+            data = await self.search(search_query, limit=page_limit, skip=skip)
+            if not data or 'results' not in data:
+                return
+            if cursor.total is None:
+                cursor.total = data['meta']['results']['total']
+            cursor.pages[skip] = data['results']
+
+        if cursor.total is None:
+            await fetch_page(0)
+            if cursor.total is None:
+                return cursor.results
+
+        semaphore = asyncio.Semaphore(concurrency or self.max_connections)
+
+        async def bounded(skip):
+            async with semaphore:
+                await fetch_page(skip)
+
+        await asyncio.gather(*(bounded(skip) for skip in cursor.pending_skips()))
+
+        if not cursor.complete:
+            print(f"Fetch incomplete: got {len(cursor.results)} of {cursor.target} results. "
+                  "Pass a PaginationCursor to fetch_all to resume.")
+        return cursor.results
+
+    async def probe_total(self, search_query):
+        """Count matching reports with a limit=1 request (None if it fails)"""
+        try:
+            return await self._probe(search_query)
+        except ProbeFailed as e:
+            print(e)
+            return None
+
+    async def _probe(self, search_query):
+        """Async version of MAUDEFetcher._probe: None for a 500, ProbeFailed otherwise"""
+        if self.cache is not None:
+            cached = self.cache.get(search_query, 1, 0)
+            if cached is not None:
+                return cached['meta']['results']['total']
+        statuses = [code for code in self.retry_policy.retry_statuses if code != 500]
+        try:
+            status, data = await self._request(self._build_url(search_query, 1, 0), statuses)
+        except (QuotaExceeded, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProbeFailed(f"Error probing query: {e!r}") from e
+        if status == 404:
+            return 0
+        if status == 500:
+            return None
+        if status != 200:
+            raise ProbeFailed(f"Error probing query: HTTP {status}")
+        if self.cache is not None:
+            self.cache.put(search_query, 1, 0, data)
+        return data['meta']['results']['total']
+
+    async def plan_shards(self, search_query, max_shard_size=None, max_results=None):
+        """Async version of MAUDEFetcher.plan_shards; probes each round concurrently"""
+        max_shard_size = max_shard_size or self.MAX_SKIP
+        bounds = shard_date_bounds(search_query)
+        if not bounds:
+            total = await self._probe(search_query)
+            return [(search_query, total)] if total else []
+
+        shards = []
+        pending = [bounds] if bounds[0] <= bounds[1] else []
+        while pending:
+            queries = [with_date_range(search_query, a, b) for a, b in pending]
+            totals = await asyncio.gather(*(self._probe(q) for q in queries))
+            probed = list(zip(pending, totals))
+            pending = split_shards(pending, queries, totals, max_shard_size, shards)
+            pending = prune_pending(pending, shards, probed, max_results, self.MAX_SKIP + self.PAGE_SIZE)
+        return finish_plan(shards)
+
+    async def fetch_sharded(self, search_query, max_results=None):
+        """Async version of MAUDEFetcher.fetch_sharded; all shards run concurrently"""
+        shard_cap = self.MAX_SKIP + self.PAGE_SIZE
+        if max_results and max_results <= shard_cap:
+            total = await self._probe(search_query)
+            if total == 0:
+                return []
+            if total is not None:
+                return await self.fetch_all(search_query, max_results=max_results)
+        shards = await self.plan_shards(search_query, max_results=max_results)
+        selected = select_shards(shards, max_results, shard_cap)
+        pages = await asyncio.gather(
+            *(self.fetch_all(query, max_results=cap) for query, cap in selected)
+        )
+        all_results = dedupe_results([r for page in pages for r in page])
+        return all_results[:max_results] if max_results else all_results
+
+
+async def _example():
+    async with AsyncMAUDEFetcher() as fetcher:
+        queries = [
+            'device.generic_name:"pacemaker"+AND+date_received:[20240101+TO+20240131]',
+            'device.generic_name:"insulin+pump"+AND+date_received:[20240101+TO+20240131]',
+            'device.generic_name:"stent"+AND+date_received:[20240101+TO+20240131]',
+        ]
+        batches = await asyncio.gather(*(fetcher.fetch_all(q, max_results=200) for q in queries))
+        for query, results in zip(queries, batches):
+            print(f"{len(results):>5}  {query}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_example())
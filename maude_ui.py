@@ -3,50 +3,60 @@
 MAUDE Database Web UI - with Subscriptions
 """
 
-import os, json, uuid
+import os, uuid
 from datetime import datetime, date, timedelta
-from io import StringIO
 from pathlib import Path
 
 import dash
-from dash import dcc, html, dash_table, Input, Output, State, ctx
+import diskcache
+from dash import dcc, html, dash_table, Input, Output, State, ctx, DiskcacheManager
 import dash_bootstrap_components as dbc
 from dotenv import load_dotenv
 import pandas as pd
 from maude_api_fetch import MAUDEFetcher
+from rate_limit import RateLimiter
+from response_cache import ResponseCache
+from result_cache import ResultCache
+from table_query import TableQueryEngine
 from canada_fetch import CanadaRecallsFetcher, DEVICE_CATEGORIES
+from subscriptions import (SUBS_DB, SubscriptionStore, sub_to_query, run_subscription as run_sub,
+                           run_all, record_runs, take_pending)
+from scheduler import SubscriptionScheduler
 
 load_dotenv()
 
-SUBS_FILE = Path(__file__).parent / "subscriptions.json"
+# Long MAUDE pulls run as background callbacks in worker processes
+job_cache = diskcache.Cache(os.getenv("JOB_CACHE_DIR", str(Path(__file__).parent / ".job_cache")))
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
-                suppress_callback_exceptions=True)
+                suppress_callback_exceptions=True,
+                background_callback_manager=DiskcacheManager(job_cache))
 
 api_key        = os.getenv("FDA_API_KEY")
-fetcher        = MAUDEFetcher(api_key=api_key)
-canada_fetcher = CanadaRecallsFetcher()
-
-# ── Subscription file helpers ─────────────────────────────────────────────────
-
-def load_subs():
-    if SUBS_FILE.exists():
-        try: return json.loads(SUBS_FILE.read_text())
-        except: return []
-    return []
-
-def save_subs(subs):
-    SUBS_FILE.write_text(json.dumps(subs, indent=2))
-
-def sub_to_query(sub):
-    parts = []
-    if sub.get("device"):
-        parts.append(f'device.generic_name:"{sub["device"].strip().replace(" ","+")}"')
-    if sub.get("manufacturer"):
-        parts.append(f'device.manufacturer_d_name:"{sub["manufacturer"].strip().replace(" ","+")}"')
-    if sub.get("event_type"):
-        parts.append(f'event_type:"{sub["event_type"]}"')
-    return "+AND+".join(parts)
+# Background searches run in forked processes; they share the quota through this
+RateLimiter.share_state(os.getenv("RATE_LIMIT_DIR", str(Path(__file__).parent / ".rate_limit")))
+cache_dir      = os.getenv("MAUDE_CACHE_DIR", str(Path(__file__).parent / ".maude_cache"))
+response_cache = ResponseCache(
+    cache_dir,
+    ttl_seconds=float(os.getenv("MAUDE_CACHE_TTL_HOURS", 168)) * 3600,
+    max_bytes=int(os.getenv("MAUDE_CACHE_MAX_MB", 512)) * 1024 * 1024,
+) if cache_dir else None
+if os.getenv("MAUDE_BACKEND", "api") == "local":
+    from maude_warehouse import LocalMAUDEFetcher
+    fetcher    = LocalMAUDEFetcher(os.getenv("MAUDE_WAREHOUSE_DIR", str(Path(__file__).parent / "maude_warehouse")))
+else:
+    fetcher    = MAUDEFetcher(api_key=api_key, cache=response_cache)
+# Written through to disk so results from background workers reach this process
+result_dir     = os.getenv("RESULT_CACHE_DIR") or str(Path(__file__).parent / ".result_cache")
+result_cache   = ResultCache(
+    result_dir,
+    max_memory_bytes=int(os.getenv("RESULT_CACHE_MEMORY_MB", 256)) * 1024 * 1024,
+    write_through=True,
+)
+table_engine   = TableQueryEngine()
+canada_dir     = os.getenv("CANADA_SNAPSHOT_DIR", str(Path(__file__).parent / ".canada_cache"))
+canada_fetcher = CanadaRecallsFetcher(snapshot_dir=canada_dir or None, stale_while_revalidate=True)
+sub_store      = SubscriptionStore(os.getenv("SUBS_DB", SUBS_DB))
 
 def _fmt(d):
     if isinstance(d, str): d = date.fromisoformat(d)
@@ -68,6 +78,30 @@ def build_query(date_from, date_to, device, manufacturer, event_type):
         parts.append(f'event_type:"{event_type}"')
     return "+AND+".join(parts) if parts else 'event_type:"Malfunction"'
 
+# ── Result tables ─────────────────────────────────────────────────────────────
+# Tables page, sort and filter on the server: the display frame lives in
+# result_cache and each request sends back only the rows on screen.
+
+def paged_table(table_id, dfd, page_size, **kwargs):
+    view_id = result_cache.put(dfd)
+    data, _, page_count = table_engine.page(dfd, 0, page_size, key=view_id)
+    return html.Div([
+        dcc.Store(id=f"{table_id}-view", data=view_id),
+        dash_table.DataTable(
+            id=table_id, data=data, page_current=0, page_size=page_size, page_count=page_count,
+            page_action="custom", sort_action="custom", filter_action="custom",
+            sort_mode="multi", sort_by=[], filter_query="", **kwargs,
+        ),
+    ])
+
+def table_page(page_current, page_size, sort_by, filter_query, view_id):
+    dfd = result_cache.get(view_id)
+    if dfd is None:
+        return [], 0, 1
+    if any(p.endswith((".sort_by", ".filter_query")) for p in ctx.triggered_prop_ids):
+        page_current = 0
+    return table_engine.page(dfd, page_current, page_size, sort_by, filter_query, key=view_id)
+
 def render_sub_card(sub):
     country = sub.get("country", "US")  # Default to US for backward compatibility
     badges = []
@@ -104,6 +138,8 @@ def render_sub_card(sub):
     last_run = sub.get("last_run","Never")
     last_run = last_run[:16].replace("T"," ") if last_run != "Never" else "Never"
     hits     = sub.get("hit_count", 0)
+    pending  = sub.get("pending", 0)
+    next_run = sub.get("next_run","")[:16].replace("T"," ")
     
     # Border color based on country
     border_color = "#dc3545" if country == "Canada" else "#0d6efd"
@@ -112,11 +148,14 @@ def render_sub_card(sub):
         dbc.CardBody([
             dbc.Row([
                 dbc.Col([
-                    html.H6(sub.get("name","Untitled"), className="mb-1 fw-bold"),
+                    html.H6([sub.get("name","Untitled"),
+                             dbc.Badge(f"🆕 {pending:,} new", color="success", className="ms-2")
+                             if pending else None], className="mb-1 fw-bold"),
                     html.Div(badges, className="mb-2"),
                     html.Small([
                         html.Span(f"Created: {created}", className="text-muted me-3"),
                         html.Span(f"Last run: {last_run}", className="text-muted me-3"),
+                        html.Span(f"Next run: {next_run}", className="text-muted me-3") if next_run else None,
                         html.Span(f"Total hits: {hits:,}", className="text-muted"),
                     ]),
                 ], width=8),
@@ -229,6 +268,9 @@ app.layout = dbc.Container([
                                       min=1, max=5000, step=100, className="mb-3", size="sm"),
                             dbc.Button("Search MAUDE Database", id="search-button",
                                        color="primary", className="w-100 mb-2", size="lg"),
+                            dbc.Button("✖ Cancel Search", id="cancel-search-btn",
+                                       color="outline-danger", className="w-100 mb-2",
+                                       size="sm", disabled=True),
                             dbc.Button("⬇ Export to CSV", id="export-button",
                                        color="secondary", className="w-100", disabled=True),
                             dcc.Download(id="download-csv"),
@@ -246,6 +288,8 @@ app.layout = dbc.Container([
 
                 dbc.Col([
                     html.Div(id="status-message", className="mb-3"),
+                    html.Div(id="search-progress", className="mb-3", style={"display":"none"}),
+                    html.Div(id="query-totals",   className="mb-3"),
                     html.Div(id="stats-cards",    className="mb-3"),
                     html.Div(id="data-table-container"),
                 ], width=12, lg=8),
@@ -352,16 +396,20 @@ app.layout = dbc.Container([
                 # Right: list + results
                 dbc.Col([
                     dbc.Row([
-                        dbc.Col(html.H5("Your Subscriptions", className="fw-bold"), width=8),
+                        dbc.Col(html.H5("Your Subscriptions", className="fw-bold"), width=6),
+                        dbc.Col(dbc.Button("▶ Run All", id="run-all-btn",
+                                           color="primary", size="sm",
+                                           className="w-100"), width=3),
                         dbc.Col(dbc.Button("🔄 Refresh List", id="refresh-all-btn",
                                            color="outline-primary", size="sm",
-                                           className="w-100"), width=4),
+                                           className="w-100"), width=3),
                     ], className="mb-3 align-items-center"),
                     html.Div(id="subs-list"),
                     html.Hr(),
                     html.H6("📊 Subscription Results", className="fw-bold mt-2"),
                     html.Div(id="sub-run-status", className="mb-2"),
                     html.Div(id="sub-results-container"),
+                    dcc.Download(id="sub-download-csv"),
                 ], width=12, lg=8),
             ], className="mt-3"),
         ]),
@@ -528,6 +576,43 @@ def update_query_preview(df, dt, device, mfr, etype, _):
     return badge, q
 
 
+# Breakdowns shown for the whole query before its rows are fetched: title ->
+# (count field, terms shown); date_received counts per day and is rolled up
+# to months
+QUERY_TOTALS = {
+    "By Event Type":     ("event_type", 10),
+    "Top Manufacturers": ("device.manufacturer_d_name.exact", 10),
+    "By Month Received": ("date_received", None),
+}
+
+def query_totals_view(query):
+    cols = []
+    for title, (field, top) in QUERY_TOTALS.items():
+        # Totals are extras: one try each, and none at all once one fails,
+        # so a query the API rejects goes straight to the search
+        counts = fetcher.count(query, field, max_retries=0)
+        if counts is None: return None
+        if not counts: continue
+        if field == "date_received":
+            months = {}
+            for c in counts:
+                months[c["term"][:6]] = months.get(c["term"][:6], 0) + c["count"]
+            rows = [(f"{m[:4]}-{m[4:]}", n) for m, n in sorted(months.items(), reverse=True)]
+        else:
+            rows = [(c["term"], c["count"]) for c in counts[:top]]
+        cols.append(dbc.Col([
+            html.H6(title, className="text-muted small mb-1"),
+            html.Div(dbc.Table(html.Tbody([html.Tr([html.Td(t), html.Td(f"{n:,}", className="text-end")])
+                                           for t, n in rows]),
+                               size="sm", striped=True, className="mb-0 small"),
+                     style={"maxHeight":"220px","overflowY":"auto"}),
+        ], width=12, md=4))
+    if not cols: return None
+    return dbc.Card(dbc.CardBody([
+        html.H6("📊 Totals for the whole query", className="fw-bold mb-2"), dbc.Row(cols),
+    ]))
+
+
 @app.callback(
     Output("stored-data","data"),
     Output("status-message","children"),
@@ -535,18 +620,40 @@ def update_query_preview(df, dt, device, mfr, etype, _):
     Input("search-button","n_clicks"),
     State("custom-query-input","value"),
     State("max-results-input","value"),
+    background=True,
+    progress=[Output("search-progress","children"), Output("query-totals","children")],
+    running=[
+        (Output("search-button","disabled"), True, False),
+        (Output("cancel-search-btn","disabled"), False, True),
+        (Output("search-progress","style"), {"display":"block"}, {"display":"none"}),
+    ],
+    cancel=Input("cancel-search-btn","n_clicks"),
     prevent_initial_call=True,
 )
-def search_maude(_, query, max_results):
+def search_maude(set_progress, _, query, max_results):
     if not query or not query.strip():
         return None, dbc.Alert("Please enter or build a search query.", color="warning"), True
+
+    totals = None
+
+    def report(fetched, expected):
+        set_progress((dbc.Progress(
+            value=100 * fetched / expected if expected else 0,
+            label=f"{fetched:,} of {expected:,} reports", striped=True, animated=True,
+            style={"height":"1.5rem"},
+        ), totals))
+
+    counting = dbc.Alert("⏳ Counting matching reports…", color="info", className="mb-0")
+    set_progress((counting, totals))
     try:
-        results = fetcher.fetch_all(query.strip(), max_results=max_results, delay=0.3)
+        totals = query_totals_view(query.strip())
+        set_progress((counting, totals))
+        results = fetcher.fetch_sharded(query.strip(), max_results=max_results, progress=report)
         if not results:
             return None, dbc.Alert("No results found.", color="warning"), True
         df  = fetcher.parse_to_dataframe(results)
         msg = dbc.Alert(f"✅ Found {len(df):,} reports.", color="success", duration=4000)
-        return df.to_json(date_format="iso", orient="split"), msg, False
+        return result_cache.put(df), msg, False
     except Exception as e:
         return None, dbc.Alert([html.Strong("Error: "), str(e)], color="danger"), True
 
@@ -556,9 +663,11 @@ def search_maude(_, query, max_results):
     Output("data-table-container","children"),
     Input("stored-data","data"),
 )
-def update_display(json_data):
-    if not json_data: return None, None
-    df = pd.read_json(StringIO(json_data), orient="split")
+def update_display(result_id):
+    if not result_id: return None, None
+    df = result_cache.get(result_id)
+    if df is None:
+        return None, dbc.Alert("These results have expired; please search again.", color="warning")
 
     def scard(title, val, color):
         return dbc.Col(dbc.Card(dbc.CardBody([
@@ -582,10 +691,9 @@ def update_display(json_data):
             dfd[c] = pd.to_datetime(dfd[c], format="%Y%m%d", errors="coerce").dt.strftime("%Y-%m-%d")
     dfd = dfd.fillna("")
 
-    tbl = dash_table.DataTable(
-        id="results-table",
+    tbl = paged_table(
+        "results-table", dfd, int(os.getenv("ROWS_PER_PAGE",25)),
         columns=[{"name":c.replace("_"," ").title(),"id":c} for c in dfd.columns],
-        data=dfd.to_dict("records"),
         style_table={"overflowX":"auto"},
         style_cell={"textAlign":"left","padding":"8px","whiteSpace":"normal",
                     "height":"auto","fontSize":"0.85rem"},
@@ -595,9 +703,6 @@ def update_display(json_data):
             {"if":{"filter_query":'{event_type} = "Death"'},"backgroundColor":"#ffe0e0","color":"#c00"},
             {"if":{"filter_query":'{event_type} = "Injury"'},"backgroundColor":"#fff3cd"},
         ],
-        page_size=int(os.getenv("ROWS_PER_PAGE",25)),
-        filter_action="native", sort_action="native", sort_mode="multi",
-        export_format="csv", export_headers="display",
     )
     return stats, dbc.Card(dbc.CardBody([html.H5("🇺🇸 US FDA Search Results", className="card-title mb-3"), tbl]))
 
@@ -608,9 +713,9 @@ def update_display(json_data):
     State("stored-data","data"),
     prevent_initial_call=True,
 )
-def export_data(_, jd):
-    if jd:
-        df = pd.read_json(StringIO(jd), orient="split")
+def export_data(_, result_id):
+    df = result_cache.get(result_id)
+    if df is not None:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         return dcc.send_data_frame(df.to_csv, f"maude_export_{ts}.csv", index=False)
 
@@ -630,15 +735,27 @@ def save_sub_from_search(_, name, device, mfr, etype):
         return dbc.Alert("Please give this subscription a name.", color="warning", duration=3000), dash.no_update
     if not any([device, mfr, etype]):
         return dbc.Alert("Set at least one filter before saving.", color="warning", duration=3000), dash.no_update
-    subs = load_subs()
-    subs.append({"id":str(uuid.uuid4())[:8],"name":name.strip(),
-                 "device":(device or "").strip(),"manufacturer":(mfr or "").strip(),
-                 "event_type":etype or "","outcome":"",
-                 "created":datetime.now().isoformat(),"last_run":"","hit_count":0})
-    save_subs(subs)
+    sub_store.add({"id":str(uuid.uuid4())[:8],"name":name.strip(),
+                   "device":(device or "").strip(),"manufacturer":(mfr or "").strip(),
+                   "event_type":etype or "","outcome":"",
+                   "created":datetime.now().isoformat(),"last_run":"","hit_count":0})
     return dbc.Alert(f"✅ Saved '{name}'!", color="success", duration=3000), str(datetime.now())
 
 
+for _table_id in ("results-table", "ca-results-table", "sub-results-table"):
+    app.callback(
+        Output(_table_id,"data"),
+        Output(_table_id,"page_current"),
+        Output(_table_id,"page_count"),
+        Input(_table_id,"page_current"),
+        Input(_table_id,"page_size"),
+        Input(_table_id,"sort_by"),
+        Input(_table_id,"filter_query"),
+        State(f"{_table_id}-view","data"),
+        prevent_initial_call=True,
+    )(table_page)
+
+
 # ── Subscriptions tab callbacks ───────────────────────────────────────────────
 
 
@@ -680,7 +797,8 @@ def preview_new_sub(country, device, mfr, etype, outcome, ca_product, ca_categor
         ], color="light", className="p-2")
     else:
         # Preview US subscription
-        q = sub_to_query({"device":device or "","manufacturer":mfr or "","event_type":etype or ""})
+        q = sub_to_query({"device":device or "","manufacturer":mfr or "","event_type":etype or "",
+                          "outcome":outcome or ""})
         if not q:
             return html.Small("Fill in at least one field above.", className="text-muted")
         return dbc.Alert([
@@ -713,15 +831,13 @@ def create_subscription(_, name, country, device, mfr, etype, outcome, ca_produc
     if not name or not name.strip():
         return dbc.Alert("A name is required.", color="warning", duration=3000), dash.no_update
     
-    subs = load_subs()
-    
     if country == "Canada":
         # Canada subscription
         if not any([ca_product and ca_product.strip(), ca_category and ca_category.strip(),
                     ca_recall_class and ca_recall_class.strip(), ca_issue and ca_issue.strip()]):
             return dbc.Alert("Set at least one filter.", color="warning", duration=3000), dash.no_update
         
-        subs.append({
+        sub_store.add({
             "id": str(uuid.uuid4())[:8],
             "name": name.strip(),
             "country": "Canada",
@@ -739,7 +855,7 @@ def create_subscription(_, name, country, device, mfr, etype, outcome, ca_produc
                     etype and etype.strip(), outcome and outcome.strip()]):
             return dbc.Alert("Set at least one filter.", color="warning", duration=3000), dash.no_update
         
-        subs.append({
+        sub_store.add({
             "id": str(uuid.uuid4())[:8],
             "name": name.strip(),
             "country": "US",
@@ -752,7 +868,6 @@ def create_subscription(_, name, country, device, mfr, etype, outcome, ca_produc
             "hit_count": 0
         })
     
-    save_subs(subs)
     return dbc.Alert(f"✅ '{name}' created!", color="success", duration=3000), str(datetime.now())
 
 
@@ -762,7 +877,7 @@ def create_subscription(_, name, country, device, mfr, etype, outcome, ca_produc
     Input("main-tabs","active_tab"),
 )
 def render_subs_list(_, tab):
-    subs = load_subs()
+    subs = sub_store.all()
     if not subs:
         return dbc.Alert(
             "No subscriptions yet. Create one on the left, or save a search from the Search tab.",
@@ -784,123 +899,153 @@ def run_subscription(n_clicks_list):
         return dash.no_update, dash.no_update, dash.no_update
 
     sub_id = triggered["index"]
-    subs   = load_subs()
-    sub    = next((s for s in subs if s["id"] == sub_id), None)
+    sub    = sub_store.get(sub_id)
     if not sub:
         return dbc.Alert("Subscription not found.", color="danger"), None, dash.no_update
 
-    country = sub.get("country", "US")
-    
     try:
-        if country == "Canada":
-            # Run Canada subscription
-            df = canada_fetcher.search(
-                product=sub.get("product", ""),
-                category=sub.get("category", ""),
-                recall_class=sub.get("recall_class", ""),
-                issue=sub.get("issue", ""),
-                date_from="",  # No date filter for subscriptions
-                date_to="",
-                include_archived=False,
-            )
-            count = len(df) if not df.empty else 0
-            
-            for s in subs:
-                if s["id"] == sub_id:
-                    s["last_run"]  = datetime.now().isoformat()
-                    s["hit_count"] = s.get("hit_count", 0) + count
-            save_subs(subs)
-            
-            if df.empty:
-                return (dbc.Alert(f"🍁 '{sub['name']}' — No Canadian recalls found.", color="info"),
-                        None, str(datetime.now()))
-            
-            # Display Canada results
-            show_cols = ["recall_id","last_updated","recall_class","product","issue","category"]
-            avail     = [c for c in show_cols if c in df.columns]
-            dfd       = df[avail].copy()
-            
-            if "last_updated" in dfd.columns:
-                dfd["last_updated"] = pd.to_datetime(
-                    dfd["last_updated"], errors="coerce"
-                ).dt.strftime("%Y-%m-%d")
-            
-            dfd = dfd.fillna("")
-            
-            tbl = dash_table.DataTable(
-                columns=[{"name":c.replace("_"," ").title(),"id":c} for c in dfd.columns],
-                data=dfd.to_dict("records"),
-                style_table={"overflowX":"auto"},
-                style_cell={"textAlign":"left","padding":"6px","fontSize":"0.82rem"},
-                style_header={"backgroundColor":"#e9ecef","fontWeight":"bold"},
-                style_data_conditional=[
-                    {"if":{"row_index":"odd"},"backgroundColor":"#f8f9fa"},
-                    {"if":{"filter_query":'{recall_class} = "Type I"'},
-                     "backgroundColor":"#ffe0e0","color":"#c00","fontWeight":"bold"},
-                ],
-                page_size=20, sort_action="native", filter_action="native", export_format="csv",
-            )
-            status = dbc.Alert(f"✅ 🍁 '{sub['name']}' — {count:,} Canadian recalls found.",
-                               color="success", duration=5000)
-            return status, dbc.Card(dbc.CardBody([
-                html.H6(f"🍁 Results for: {sub['name']}", className="fw-bold mb-3"), tbl
-            ])), str(datetime.now())
-            
-        else:
-            # Run US subscription
-            query = sub_to_query(sub)
-            if not query:
-                return dbc.Alert("Subscription has no valid filters.", color="warning"), None, dash.no_update
-
-            today     = date.today()
-            from_date = (today - timedelta(days=90)).strftime("%Y%m%d")
-            to_date   = today.strftime("%Y%m%d")
-            full_q    = f"date_received:[{from_date}+TO+{to_date}]+AND+{query}"
-
-            results = fetcher.fetch_all(full_q, max_results=200, delay=0.3)
-            count   = len(results) if results else 0
-
-            for s in subs:
-                if s["id"] == sub_id:
-                    s["last_run"]  = datetime.now().isoformat()
-                    s["hit_count"] = s.get("hit_count", 0) + count
-            save_subs(subs)
-
-            if not results:
-                return (dbc.Alert(f"🇺🇸 '{sub['name']}' — No results in last 90 days.", color="info"),
-                        None, str(datetime.now()))
-
-            df = fetcher.parse_to_dataframe(results)
-            dcols = ["report_number","date_received","event_type",
-                     "device_generic_name","device_manufacturer","outcome"]
-            avail = [c for c in dcols if c in df.columns]
-            dfd   = df[avail].copy()
-            if "date_received" in dfd.columns:
-                dfd["date_received"] = pd.to_datetime(
-                    dfd["date_received"], format="%Y%m%d", errors="coerce"
-                ).dt.strftime("%Y-%m-%d")
-            dfd = dfd.fillna("")
-
-            tbl = dash_table.DataTable(
-                columns=[{"name":c.replace("_"," ").title(),"id":c} for c in dfd.columns],
-                data=dfd.to_dict("records"),
-                style_table={"overflowX":"auto"},
-                style_cell={"textAlign":"left","padding":"6px","fontSize":"0.82rem"},
-                style_header={"backgroundColor":"#e9ecef","fontWeight":"bold"},
-                style_data_conditional=[
-                    {"if":{"row_index":"odd"},"backgroundColor":"#f8f9fa"},
-                    {"if":{"filter_query":'{event_type} = "Death"'},"backgroundColor":"#ffe0e0","color":"#c00"},
-                ],
-                page_size=20, sort_action="native", filter_action="native", export_format="csv",
-            )
-            status = dbc.Alert(f"✅ 🇺🇸 '{sub['name']}' — {count:,} results (last 90 days).",
-                               color="success", duration=5000)
-            return status, dbc.Card(dbc.CardBody([
-                html.H6(f"🇺🇸 Results for: {sub['name']}", className="fw-bold mb-3"), tbl
-            ])), str(datetime.now())
-
+        run = run_sub(sub, fetcher, canada_fetcher)
     except Exception as e:
         return dbc.Alert([html.Strong("Error: "), str(e)], color="danger"), None, dash.no_update
+    if run.error:
+        return dbc.Alert(run.error, color="warning"), None, dash.no_update
+    record_runs([run], sub_store, extra={sub_id: {"pending": 0}})
+    # Show what scheduled runs found since this subscription was last viewed
+    pending = take_pending(sub_id)
+    if not pending.empty:
+        run.hits = pd.concat([pending, run.hits], ignore_index=True)
+    return *sub_run_view(run), str(datetime.now())
+
+
+def sub_run_view(run):
+    """Status alert and hits table for one subscription run."""
+    sub, df, count = run.sub, run.hits, run.count
+
+    if sub.get("country", "US") == "Canada":
+        if df.empty:
+            return dbc.Alert(f"🍁 '{sub['name']}' — No new Canadian recalls.", color="info"), None
+
+        # Display Canada results
+        show_cols = ["recall_id","last_updated","recall_class","product","issue","category"]
+        avail     = [c for c in show_cols if c in df.columns]
+        dfd       = df[avail].copy()
+
+        if "last_updated" in dfd.columns:
+            dfd["last_updated"] = pd.to_datetime(
+                dfd["last_updated"], errors="coerce"
+            ).dt.strftime("%Y-%m-%d")
+
+        dfd = dfd.fillna("")
+
+        tbl = paged_table(
+            "sub-results-table", dfd, 20,
+            columns=[{"name":c.replace("_"," ").title(),"id":c} for c in dfd.columns],
+            style_table={"overflowX":"auto"},
+            style_cell={"textAlign":"left","padding":"6px","fontSize":"0.82rem"},
+            style_header={"backgroundColor":"#e9ecef","fontWeight":"bold"},
+            style_data_conditional=[
+                {"if":{"row_index":"odd"},"backgroundColor":"#f8f9fa"},
+                {"if":{"filter_query":'{recall_class} = "Type I"'},
+                 "backgroundColor":"#ffe0e0","color":"#c00","fontWeight":"bold"},
+            ],
+        )
+        status = dbc.Alert(f"✅ 🍁 '{sub['name']}' — {count:,} new Canadian recalls.",
+                           color="success", duration=5000)
+        return status, dbc.Card(dbc.CardBody([
+            sub_results_header(f"🍁 Results for: {sub['name']}", df), tbl
+        ]))
+
+    if df.empty:
+        return dbc.Alert(f"🇺🇸 '{sub['name']}' — No new reports since {run.since}.", color="info"), None
+
+    dcols = ["report_number","date_received","event_type",
+             "device_generic_name","device_manufacturer","outcome"]
+    avail = [c for c in dcols if c in df.columns]
+    dfd   = df[avail].copy()
+    if "date_received" in dfd.columns:
+        dfd["date_received"] = pd.to_datetime(
+            dfd["date_received"], format="%Y%m%d", errors="coerce"
+        ).dt.strftime("%Y-%m-%d")
+    dfd = dfd.fillna("")
+
+    tbl = paged_table(
+        "sub-results-table", dfd, 20,
+        columns=[{"name":c.replace("_"," ").title(),"id":c} for c in dfd.columns],
+        style_table={"overflowX":"auto"},
+        style_cell={"textAlign":"left","padding":"6px","fontSize":"0.82rem"},
+        style_header={"backgroundColor":"#e9ecef","fontWeight":"bold"},
+        style_data_conditional=[
+            {"if":{"row_index":"odd"},"backgroundColor":"#f8f9fa"},
+            {"if":{"filter_query":'{event_type} = "Death"'},"backgroundColor":"#ffe0e0","color":"#c00"},
+        ],
+    )
+    status = dbc.Alert(f"✅ 🇺🇸 '{sub['name']}' — {count:,} new reports since {run.since}."
+                       + (" More pending; run again to continue." if run.more else ""),
+                       color="success", duration=5000)
+    return status, dbc.Card(dbc.CardBody([
+        sub_results_header(f"🇺🇸 Results for: {sub['name']}", df), tbl
+    ]))
+
+
+@app.callback(
+    Output("sub-run-status","children", allow_duplicate=True),
+    Output("sub-results-container","children", allow_duplicate=True),
+    Output("subs-store","data", allow_duplicate=True),
+    Input("run-all-btn","n_clicks"),
+    running=[(Output("run-all-btn","disabled"), True, False)],
+    prevent_initial_call=True,
+)
+def run_all_subscriptions(_):
+    subs = sub_store.all()
+    if not subs:
+        return dbc.Alert("No subscriptions to run.", color="info"), None, dash.no_update
+    runs = run_all(subs, fetcher, canada_fetcher)
+    record_runs(runs, sub_store, keep_hits=True)
+
+    rows = []
+    for run in runs:
+        flag = "🍁" if run.sub.get("country", "US") == "Canada" else "🇺🇸"
+        if run.error:
+            note = html.Span(run.error, className="text-danger")
+        elif run.more:
+            note = "More pending; run again to continue."
+        else:
+            note = ""
+        rows.append(html.Tr([html.Td(f"{flag} {run.sub.get('name','Untitled')}"),
+                             html.Td(f"{run.count:,}" if not run.error else "—"), html.Td(note)]))
+    failed = sum(1 for run in runs if run.error)
+    total  = sum(run.count for run in runs)
+    status = dbc.Alert(f"✅ Ran {len(runs)} subscriptions — {total:,} new hits"
+                       + (f", {failed} failed." if failed else "."),
+                       color="warning" if failed else "success")
+    summary = dbc.Card(dbc.CardBody([
+        html.H6("Run all subscriptions", className="fw-bold mb-3"),
+        dbc.Table([html.Thead(html.Tr([html.Th("Subscription"), html.Th("New hits"), html.Th("")])),
+                   html.Tbody(rows)], size="sm", striped=True, className="mb-0"),
+    ]))
+    return status, summary, str(datetime.now())
+
+
+def sub_results_header(title, df):
+    return dbc.Row([
+        dbc.Col(html.H6(title, className="fw-bold mb-0"), width=8),
+        dbc.Col(dbc.Button("📥 Export CSV", id="sub-export-btn", color="outline-success",
+                           size="sm", className="w-100"), width=4),
+        dcc.Store(id="sub-stored-data", data=result_cache.put(df)),
+    ], className="mb-3 align-items-center")
+
+
+@app.callback(
+    Output("sub-download-csv","data"),
+    Input("sub-export-btn","n_clicks"),
+    State("sub-stored-data","data"),
+    prevent_initial_call=True,
+)
+def export_sub_results(n, result_id):
+    df = result_cache.get(result_id)
+    if n and df is not None:
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return dcc.send_data_frame(df.to_csv, f"subscription_export_{ts}.csv", index=False)
 
 
 @app.callback(
@@ -912,8 +1057,8 @@ def delete_subscription(n_clicks_list):
     triggered = ctx.triggered_id
     if not triggered or not any(n for n in n_clicks_list if n):
         return dash.no_update
-    subs = [s for s in load_subs() if s["id"] != triggered["index"]]
-    save_subs(subs)
+    sub_store.delete(triggered["index"])
+    take_pending(triggered["index"])
     return str(datetime.now())
 
 
@@ -960,7 +1105,7 @@ def fetch_canada(_, product, category, recall_class, issue, date_from, date_to,
             f"🍁 Found {len(df):,} Canadian medical device recalls.",
             color="success", duration=4000,
         )
-        return df.to_json(date_format="iso", orient="split"), msg, False
+        return result_cache.put(df), msg, False
 
     except Exception as e:
         return None, dbc.Alert([html.Strong("Error: "), str(e)], color="danger"), True
@@ -971,11 +1116,13 @@ def fetch_canada(_, product, category, recall_class, issue, date_from, date_to,
     Output("ca-table-container","children"),
     Input("ca-stored-data",     "data"),
 )
-def update_canada_display(json_data):
-    if not json_data:
+def update_canada_display(result_id):
+    if not result_id:
         return None, None
 
-    df = pd.read_json(StringIO(json_data), orient="split")
+    df = result_cache.get(result_id)
+    if df is None:
+        return None, dbc.Alert("These results have expired; please search again.", color="warning")
     stats_data = canada_fetcher.summary_stats(df)
 
     def scard(title, val, color, border=""):
@@ -1012,10 +1159,9 @@ def update_canada_display(json_data):
         else:
             col_defs.append({"name": c.replace("_", " ").title(), "id": c})
 
-    table = dash_table.DataTable(
-        id="ca-results-table",
+    table = paged_table(
+        "ca-results-table", dfd, int(os.getenv("ROWS_PER_PAGE", 25)),
         columns=col_defs,
-        data=dfd.to_dict("records"),
         style_table={"overflowX": "auto"},
         style_cell={"textAlign":"left","padding":"8px","whiteSpace":"normal",
                     "height":"auto","fontSize":"0.85rem"},
@@ -1027,12 +1173,6 @@ def update_canada_display(json_data):
             {"if":{"filter_query":'{recall_class} = "Type II"'},
              "backgroundColor":"#fff3cd"},
         ],
-        page_size=int(os.getenv("ROWS_PER_PAGE", 25)),
-        filter_action="native",
-        sort_action="native",
-        sort_mode="multi",
-        export_format="csv",
-        export_headers="display",
         markdown_options={"link_target": "_blank"},
     )
 
@@ -1048,9 +1188,9 @@ def update_canada_display(json_data):
     State("ca-stored-data",   "data"),
     prevent_initial_call=True,
 )
-def export_canada(_, json_data):
-    if json_data:
-        df = pd.read_json(StringIO(json_data), orient="split")
+def export_canada(_, result_id):
+    df = result_cache.get(result_id)
+    if df is not None:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         return dcc.send_data_frame(df.to_csv, f"canada_recalls_{ts}.csv", index=False)
 
@@ -1064,6 +1204,10 @@ if __name__ == "__main__":
     print("   US FDA MAUDE + Health Canada")
     print("="*60)
     print(f"Starting server at http://{host}:{port}")
-    print(f"Subscriptions stored at: {SUBS_FILE}")
+    print(f"Subscriptions stored at: {sub_store.path}")
     print("="*60)
+    # The debug reloader runs this block in a watcher process too; only the
+    # serving process (WERKZEUG_RUN_MAIN) should run subscriptions
+    if os.getenv("SUB_SCHEDULER", "1") == "1" and os.getenv("WERKZEUG_RUN_MAIN") == "true":
+        SubscriptionScheduler.from_env(fetcher, canada_fetcher, sub_store).start()
     app.run(host=host, port=port, debug=True)
\ No newline at end of file
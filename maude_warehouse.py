@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Local MAUDE warehouse built from openFDA bulk download files.
+Device event zips (https://open.fda.gov/data/downloads/) are loaded into a
+Parquet dataset partitioned by the month of `date_received`, and
+LocalMAUDEFetcher answers the query syntax built by the UI from it, offline
+and without touching the API quota.
+
+    python maude_warehouse.py ingest downloads/device-event --warehouse maude_warehouse
+    python maude_warehouse.py query maude_warehouse 'device.generic_name:"pacemaker"'
+"""
+
+import argparse
+import json
+import re
+import zipfile
+from pathlib import Path
+from typing import Callable
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from maude_api_fetch import MAUDEFetcher
+
+PARTITION_SCHEMA = pa.schema([("received_month", pa.string())])
+
+# Columns the local query engine filters on; the full report is kept in `raw`
+WAREHOUSE_SCHEMA = pa.schema([
+    ("report_number", pa.string()),
+    ("date_received", pa.string()),
+    ("date_of_event", pa.string()),
+    ("event_type", pa.string()),
+    ("generic_name", pa.string()),
+    ("manufacturer_d_name", pa.string()),
+    ("brand_name", pa.string()),
+    ("raw", pa.string()),
+    ("received_month", pa.string()),
+])
+
+# Query fields -> warehouse columns. Device fields hold one line per device,
+# since a report matches if any of its devices does.
+PHRASE_FIELDS = {
+    "device.generic_name": "generic_name",
+    "device.manufacturer_d_name": "manufacturer_d_name",
+    "device.brand_name": "brand_name",
+}
+EXACT_FIELDS = {"event_type": "event_type", "report_number": "report_number"}
+RANGE_FIELDS = {"date_received": "date_received", "date_of_event": "date_of_event"}
+# Not a warehouse column; only report_predicate evaluates it
+OUTCOME_FIELD = "patient.sequence_number_outcome"
+
+TERM_RE = re.compile(r'^([\w.]+):(?:"([^"]*)"|\[(\d{8})\+TO\+(\d{8})\])$')
+MANIFEST = "_ingested.json"
+
+
+class UnsupportedQuery(ValueError):
+    """Raised for query syntax the local warehouse cannot evaluate."""
+
+
+# ── Ingestion ─────────────────────────────────────────────────────────────────
+
+def _report_row(report: dict) -> dict:
+    devices = report.get("device") or []
+
+    def device_lines(key):
+        values = [d.get(key) for d in devices if d.get(key)]
+        return "\n".join(values) if values else None
+
+    received = report.get("date_received")
+    return {
+        "report_number": report.get("report_number"),
+        "date_received": received,
+        "date_of_event": report.get("date_of_event"),
+        "event_type": report.get("event_type"),
+        "generic_name": device_lines("generic_name"),
+        "manufacturer_d_name": device_lines("manufacturer_d_name"),
+        "brand_name": device_lines("brand_name"),
+        "raw": json.dumps(report, separators=(",", ":")),
+        "received_month": received[:6] if received else "unknown",
+    }
+
+
+def _file_tag(zip_path: Path, source_dir: Path) -> str:
+    # openFDA reuses file names across quarters (2024q1/device-event-0001-of-0004...)
+    relative = zip_path.relative_to(source_dir).as_posix()
+    return re.sub(r"[^\w.-]+", "_", relative.removesuffix(".json.zip"))
+
+
+def ingest_zip(zip_path, warehouse_dir, tag: str) -> int:
+    """
+    Load one bulk zip into the warehouse, replacing anything it loaded before.
+
+    Returns the number of reports written.
+    """
+    warehouse_dir = Path(warehouse_dir)
+    for stale in warehouse_dir.glob(f"received_month=*/{tag}-*.parquet"):
+        stale.unlink()
+
+    count = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [name for name in archive.namelist() if name.endswith(".json")]
+        for index, name in enumerate(members):
+            with archive.open(name) as f:
+                reports = json.load(f).get("results", [])
+            if not reports:
+                continue
+            table = pa.Table.from_pylist([_report_row(r) for r in reports], schema=WAREHOUSE_SCHEMA)
+            ds.write_dataset(
+                table,
+                warehouse_dir,
+                format="parquet",
+                partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+                basename_template=f"{tag}-{index}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                max_partitions=10_000,
+                file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+            )
+            count += len(reports)
+    return count
+
+
+def ingest_directory(source_dir, warehouse_dir) -> int:
+    """
+    Ingest every *.json.zip under `source_dir` (searched recursively).
+
+    Zips already ingested with the same size and modification time are
+    skipped, so re-running after downloading new weekly files only loads
+    those. Returns the number of reports written.
+    """
+    source_dir, warehouse_dir = Path(source_dir), Path(warehouse_dir)
+    warehouse_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = warehouse_dir / MANIFEST
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    total = 0
+    for zip_path in sorted(source_dir.rglob("*.json.zip")):
+        tag = _file_tag(zip_path, source_dir)
+        stat = zip_path.stat()
+        signature = [stat.st_size, int(stat.st_mtime)]
+        if manifest.get(tag) == signature:
+            print(f"Skipping {zip_path.name} (already ingested)")
+            continue
+        count = ingest_zip(zip_path, warehouse_dir, tag)
+        manifest[tag] = signature
+        manifest_path.write_text(json.dumps(manifest, indent=2))
+        total += count
+        print(f"Ingested {count} reports from {zip_path}")
+    return total
+
+
+# ── Query translation ─────────────────────────────────────────────────────────
+
+def _phrase_pattern(phrase: str) -> str:
+    # Whole-word, case-insensitive phrase match within one device line
+    words = phrase.replace("+", " ").split()
+    return r"\b" + r"[^\w\n]+".join(re.escape(w) for w in words) + r"\b"
+
+
+def _terms(search_query: str, phrase_fields=PHRASE_FIELDS.keys() | EXACT_FIELDS.keys()):
+    # (field, phrase, start, end) per `+AND+` term; exactly one of phrase or start/end is set
+    query = "+".join(search_query.split())
+    for term in query.split("+AND+") if query else []:
+        match = TERM_RE.match(term)
+        supported = RANGE_FIELDS if match and match[3] else phrase_fields
+        if not match or match[1] not in supported:
+            raise UnsupportedQuery(f"Unsupported query term for local search: {term}")
+        yield match.groups()
+
+
+def query_filter(search_query: str) -> ds.Expression | None:
+    """
+    Translate a `+AND+` conjunction of field terms into a dataset filter.
+
+    Supports the syntax produced by build_query / sub_to_query: quoted
+    phrases on device names, exact event_type / report_number, and
+    [YYYYMMDD+TO+YYYYMMDD] ranges on date_received / date_of_event.
+    Raises UnsupportedQuery for anything else (OR, grouping, other fields).
+    """
+    expression = None
+    for field, phrase, start, end in _terms(search_query):
+        if start:
+            column = ds.field(RANGE_FIELDS[field])
+            condition = (column >= start) & (column <= end)
+            if field == "date_received":
+                month = ds.field("received_month")
+                condition &= (month >= start[:6]) & (month <= end[:6])
+        elif field in PHRASE_FIELDS:
+            condition = pc.match_substring_regex(
+                ds.field(PHRASE_FIELDS[field]), pattern=_phrase_pattern(phrase), ignore_case=True
+            )
+        else:
+            condition = pc.utf8_lower(ds.field(EXACT_FIELDS[field])) == phrase.replace("+", " ").lower()
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _outcomes(report: dict) -> set[str]:
+    # Every patient's outcomes, lowercased; the API stores a list or a single value
+    found = set()
+    for patient in report.get("patient") or []:
+        outcomes = patient.get("sequence_number_outcome") or []
+        for outcome in outcomes if isinstance(outcomes, list) else [outcomes]:
+            if outcome:
+                found.add(outcome.lower())
+    return found
+
+
+def report_predicate(search_query: str) -> Callable[[dict], bool]:
+    """
+    Evaluate the same query syntax as `query_filter` against a single
+    API report, e.g. to split the results of one combined fetch between
+    the queries it was built from. Quoted patient.sequence_number_outcome
+    terms are also accepted and match any outcome of any patient.
+    Raises UnsupportedQuery for anything else.
+    """
+    checks = []
+    for field, phrase, start, end in _terms(search_query, PHRASE_FIELDS.keys() | EXACT_FIELDS.keys() | {OUTCOME_FIELD}):
+        if start:
+            checks.append(lambda r, f=field, s=start, e=end: s <= (r.get(f) or "") <= e)
+        elif field == OUTCOME_FIELD:
+            value = phrase.replace("+", " ").lower()
+            checks.append(lambda r, v=value: v in _outcomes(r))
+        elif field in PHRASE_FIELDS:
+            pattern, key = re.compile(_phrase_pattern(phrase), re.IGNORECASE), field.split(".", 1)[1]
+            checks.append(lambda r, p=pattern, k=key: any(
+                p.search(d.get(k) or "") for d in r.get("device") or []
+            ))
+        else:
+            value = phrase.replace("+", " ").lower()
+            checks.append(lambda r, f=field, v=value: (r.get(f) or "").lower() == v)
+    return lambda report: all(check(report) for check in checks)
+
+
+# ── Fetcher ───────────────────────────────────────────────────────────────────
+
+class LocalMAUDEFetcher:
+    """Drop-in for MAUDEFetcher that answers queries from a local warehouse"""
+
+    # Output is identical to the API client, so parsing and export are shared
+    parse_to_dataframe = MAUDEFetcher.parse_to_dataframe
+    save_to_csv = MAUDEFetcher.save_to_csv
+    save_to_json = MAUDEFetcher.save_to_json
+
+    def __init__(self, warehouse_dir):
+        """
+        Args:
+            warehouse_dir (str): Directory populated by `ingest_directory`
+        """
+        self.warehouse_dir = Path(warehouse_dir)
+
+    def _dataset(self) -> ds.Dataset | None:
+        if not any(self.warehouse_dir.glob("received_month=*")):
+            print(f"Local warehouse {self.warehouse_dir} is empty; run maude_warehouse.py ingest")
+            return None
+        # Rediscovered per query so newly ingested files are picked up
+        return ds.dataset(
+            self.warehouse_dir,
+            format="parquet",
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+            exclude_invalid_files=True,
+        )
+
+    def _matches(self, search_query: str, skip: int = 0, limit: int | None = None) -> tuple[int, pa.Table] | None:
+        """
+        (number of matches, matching reports [skip, skip + limit) in
+        (date_received, report_number) order), or None on error
+
+        Matches are sorted and sliced on their keys alone; the `raw` JSON is
+        then read for the selected reports only.
+        """
+        dataset = self._dataset()
+        if dataset is None:
+            return None
+        try:
+            where = query_filter(search_query)
+        except UnsupportedQuery as e:
+            print(e)
+            return None
+        order = [("date_received", "ascending"), ("report_number", "ascending")]
+        if not skip and limit is None:
+            table = dataset.to_table(columns=["date_received", "report_number", "raw"], filter=where)
+            return table.num_rows, table.sort_by(order)
+
+        keys = dataset.to_table(columns=["date_received", "report_number"], filter=where).sort_by(order)
+        page = keys.slice(skip, limit)
+        numbers = page.column("report_number")
+        selected = ds.field("report_number").isin(pc.unique(numbers).drop_null())
+        if numbers.null_count:
+            selected |= ds.field("report_number").is_null()
+        table = dataset.to_table(
+            columns=["date_received", "report_number", "raw"],
+            filter=selected if where is None else where & selected,
+        )
+        return keys.num_rows, table.sort_by(order).slice(0, page.num_rows)
+
+    def probe_total(self, search_query: str) -> int | None:
+        """Count matching reports (None if the query cannot be evaluated)"""
+        dataset = self._dataset()
+        if dataset is None:
+            return None
+        try:
+            return dataset.count_rows(filter=query_filter(search_query))
+        except UnsupportedQuery as e:
+            print(e)
+            return None
+
+    def count(self, search_query: str, field: str, limit: int = 1000, **_) -> list | None:
+        """
+        Tally matching reports by one field, like MAUDEFetcher.count
+
+        Supports event_type, date_received, date_of_event and the device
+        name fields (with or without .exact). A report is counted once per
+        distinct device value, as the API does.
+        """
+        base = field.removesuffix(".exact")
+        column = EXACT_FIELDS.get(base) or RANGE_FIELDS.get(base) or PHRASE_FIELDS.get(base)
+        if column is None:
+            print(f"Cannot count '{field}' in the local warehouse")
+            return None
+        dataset = self._dataset()
+        if dataset is None:
+            return None
+        try:
+            values = dataset.to_table(columns=[column], filter=query_filter(search_query)).column(column)
+        except UnsupportedQuery as e:
+            print(e)
+            return None
+        if base in PHRASE_FIELDS:
+            lines = pc.split_pattern(values, "\n")
+            flat = pa.table({"report": pc.list_parent_indices(lines), "value": pc.list_flatten(lines)})
+            values = flat.group_by(["report", "value"]).aggregate([]).column("value")
+        counts = pc.value_counts(pc.drop_null(values))
+        pairs = sorted(
+            zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()),
+            key=lambda tc: (-tc[1], tc[0]),
+        )
+        if base not in RANGE_FIELDS:
+            pairs = pairs[:min(limit, 1000)]
+        return [{"term": term, "count": n} for term, n in pairs]
+
+    def search(self, search_query: str, limit: int = 100, skip: int = 0) -> dict | None:
+        """
+        Search the warehouse, returning a response shaped like the API's
+
+        Returns:
+            dict: {'meta': {'results': {...}}, 'results': [...]}, or None if
+            nothing matched or the query is not supported locally
+        """
+        matches = self._matches(search_query, skip, min(limit, 1000))
+        if matches is None:
+            return None
+        total, page = matches
+        if total == 0:
+            print(f"No results found for query: {search_query}")
+            return None
+        return {
+            "meta": {"results": {"skip": skip, "limit": limit, "total": total}},
+            "results": [json.loads(raw) for raw in page.column("raw").to_pylist()],
+        }
+
+    def fetch_all(self, search_query: str, max_results: int | None = None, **_) -> list:
+        """
+        Fetch all matching reports; there is no skip ceiling locally
+
+        Extra keyword arguments of MAUDEFetcher.fetch_all (delay, workers,
+        cursor) are accepted and ignored.
+        """
+        matches = self._matches(search_query, limit=max_results or None)
+        if matches is None:
+            return []
+        return [json.loads(raw) for raw in matches[1].column("raw").to_pylist()]
+
+    # A single scan already covers any date range
+    def fetch_sharded(self, search_query: str, max_results: int | None = None, **_) -> list:
+        return self.fetch_all(search_query, max_results=max_results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    ing = sub.add_parser("ingest", help="load bulk device-event zips")
+    ing.add_argument("source", help="directory containing *.json.zip files")
+    ing.add_argument("--warehouse", default="maude_warehouse")
+    qry = sub.add_parser("query", help="run a query against the warehouse")
+    qry.add_argument("warehouse")
+    qry.add_argument("query")
+    qry.add_argument("--max-results", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        count = ingest_directory(args.source, args.warehouse)
+        print(f"Ingested {count} reports into {args.warehouse}")
+    else:
+        fetcher = LocalMAUDEFetcher(args.warehouse)
+        df = fetcher.parse_to_dataframe(fetcher.fetch_all(args.query, max_results=args.max_results))
+        print(f"{fetcher.probe_total(args.query)} matching reports")
+        if not df.empty:
+            print(df[["report_number", "date_received", "event_type", "device_generic_name"]].to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Local stub of the openFDA device event endpoint
+Replays pages recorded in a ResponseCache directory, so the sync and async
+clients can be exercised offline and deterministically.
+
+    python openfda_stub.py record recordings 'device.generic_name:"pacemaker"' --max-results 2000
+    python openfda_stub.py serve recordings --port 8765
+
+Point a client at it with base_url="http://127.0.0.1:8765/device/event.json".
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from response_cache import ResponseCache
+
+NOT_FOUND = {"error": {"code": "NOT_FOUND", "message": "No matches found!"}}
+
+
+def open_recordings(directory) -> ResponseCache:
+    """A ResponseCache over `directory` whose entries never expire."""
+    return ResponseCache(directory, ttl_seconds=float("inf"), max_bytes=2**62)
+
+
+def make_handler(recordings: ResponseCache):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            # Split by hand: `+` is part of openFDA query syntax, not a space
+            params = dict(p.split("=", 1) for p in url.query.split("&") if "=" in p)
+            params = {k: unquote(v) for k, v in params.items()}
+            params.pop("api_key", None)
+            search = params.pop("search", "")
+            limit = int(params.pop("limit", 1))
+            skip = int(params.pop("skip", 0))
+            response = recordings.get(search, limit, skip, **params)
+            self._send(200, response) if response is not None else self._send(404, NOT_FOUND)
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub(directory, host="127.0.0.1", port=0):
+    """
+    Serve recordings from `directory` on a background thread.
+
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(open_recordings(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/device/event.json"
+
+
+def record(directory, search_query, max_results=None, api_key=None):
+    """Fetch a query from the live API, recording every page into `directory`."""
+    from maude_api_fetch import MAUDEFetcher
+
+    fetcher = MAUDEFetcher(api_key=api_key, cache=open_recordings(directory))
+    return len(fetcher.fetch_all(search_query, max_results=max_results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="record live pages for a query")
+    rec.add_argument("directory")
+    rec.add_argument("query")
+    rec.add_argument("--max-results", type=int)
+    srv = sub.add_parser("serve", help="replay recorded pages")
+    srv.add_argument("directory")
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        count = record(args.directory, args.query, args.max_results)
+        print(f"Recorded {count} results into {args.directory}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port),
+                                     make_handler(open_recordings(args.directory)))
+        print(f"Replaying {args.directory} at http://{args.host}:{args.port}/device/event.json")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Token-bucket rate limiting for the openFDA API.
+One limiter is shared per API key so concurrent callers (threads, Dash
+callbacks, shard workers) draw from the same quota. With `share_state`,
+limiters also keep their state in a file so separate processes (Dash
+background jobs, a scheduler worker) draw from it too.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: limiters stay per process
+    fcntl = None
+
+# openFDA quotas: https://open.fda.gov/apis/authentication/
+PER_MINUTE = 240
+PER_DAY_NO_KEY = 1_000
+PER_DAY_WITH_KEY = 120_000
+
+
+class QuotaExceeded(RuntimeError):
+    """Raised when the daily request quota for a key has been used up."""
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket with a daily request cap.
+
+    Tokens refill at `per_minute / 60` per second up to `burst`. Callers that
+    find the bucket empty reserve a future token and sleep until it is due,
+    so waiting callers are served in order. A 429 halves the refill rate and
+    pauses everyone; successful requests restore it gradually.
+
+    With a `state_path`, the bucket, pause and daily count live in that file
+    (locked while in use), so every process using it shares one quota.
+    """
+
+    _shared: dict[str | None, "RateLimiter"] = {}
+    _shared_lock = threading.Lock()
+    state_dir: Path | None = None  # see share_state
+
+    def __init__(self, per_minute: int = PER_MINUTE, per_day: int = PER_DAY_NO_KEY,
+                 burst: int | None = None, state_path: str | Path | None = None):
+        self.max_rate = per_minute / 60.0
+        self.min_rate = self.max_rate / 16
+        self.rate = self.max_rate
+        self.capacity = burst or max(1, per_minute // 12)
+        self.per_day = per_day
+        self.state_path = Path(state_path) if state_path and fcntl else None
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._day = date.today()
+        self._day_count = 0
+        self._lock = threading.Lock()
+        _limiters.add(self)
+
+    @classmethod
+    def for_key(cls, api_key: str | None) -> "RateLimiter":
+        """Return the process-wide limiter for an API key (or for unkeyed access)."""
+        with cls._shared_lock:
+            if api_key not in cls._shared:
+                per_day = PER_DAY_WITH_KEY if api_key else PER_DAY_NO_KEY
+                cls._shared[api_key] = cls(per_minute=PER_MINUTE, per_day=per_day,
+                                           state_path=cls._state_file(api_key))
+            return cls._shared[api_key]
+
+    @classmethod
+    def share_state(cls, directory: str | Path):
+        """Keep the state of the `for_key` limiters in `directory`, shared across processes."""
+        cls.state_dir = Path(directory)
+        cls.state_dir.mkdir(parents=True, exist_ok=True)
+        with cls._shared_lock:
+            for api_key, limiter in cls._shared.items():
+                limiter.state_path = cls._state_file(api_key) if fcntl else None
+
+    @classmethod
+    def _state_file(cls, api_key: str | None) -> Path | None:
+        if cls.state_dir is None:
+            return None
+        # Never put the key itself in a file name
+        name = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else "no_key"
+        return cls.state_dir / f"ratelimit-{name}.json"
+
+    # ── Shared state ──────────────────────────────────────────────────────────
+
+    @contextmanager
+    def _state(self):
+        """Hold the lock; with a state file, load the state before and save it after."""
+        with self._lock:
+            if self.state_path is None:
+                yield
+                return
+            with open(self.state_path, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                try:
+                    self._load(json.loads(f.read()))
+                except (ValueError, KeyError):
+                    pass  # new or unreadable file: start from this process's state
+                yield
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(self._dump()))
+
+    def _load(self, state: dict):
+        # Times are stored as wall-clock seconds; monotonic clocks are per process
+        offset = time.time() - time.monotonic()
+        self.rate = state["rate"]
+        self._tokens = state["tokens"]
+        self._updated = state["updated"] - offset
+        self._paused_until = state["paused_until"] - offset
+        self._day = date.fromisoformat(state["day"])
+        self._day_count = state["day_count"]
+
+    def _dump(self) -> dict:
+        offset = time.time() - time.monotonic()
+        return {
+            "rate": self.rate,
+            "tokens": self._tokens,
+            "updated": self._updated + offset,
+            "paused_until": self._paused_until + offset,
+            "day": self._day.isoformat(),
+            "day_count": self._day_count,
+        }
+
+    # ── Token accounting ──────────────────────────────────────────────────────
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Claim one request slot and return how many seconds to wait before using it.
+
+        Raises QuotaExceeded once the daily quota is spent.
+        """
+        with self._state():
+            today = date.today()
+            if today != self._day:
+                self._day, self._day_count = today, 0
+            if self._day_count >= self.per_day:
+                raise QuotaExceeded(
+                    f"Daily openFDA quota of {self.per_day:,} requests reached"
+                )
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            self._day_count += 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    # ── Feedback from responses ───────────────────────────────────────────────
+
+    def on_throttled(self, retry_after: float | None = None):
+        """Back off after a 429: halve the rate and pause all callers."""
+        with self._state():
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._paused_until = max(self._paused_until, now + pause)
+
+    def on_success(self):
+        """Recover the rate additively after a throttle."""
+        # Another process may have been throttled, so shared state is always read
+        if self.rate < self.max_rate or self.state_path:
+            with self._state():
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    @property
+    def remaining_today(self) -> int:
+        with self._state():
+            if date.today() != self._day:
+                return self.per_day
+            return max(0, self.per_day - self._day_count)
+
+
+# Every live limiter, for _reset_locks
+_limiters: "weakref.WeakSet[RateLimiter]" = weakref.WeakSet()
+
+
+def _reset_locks():
+    # A forked child (Dash background job) must not inherit a lock held by a
+    # thread that does not exist there
+    RateLimiter._shared_lock = threading.Lock()
+    for limiter in list(_limiters):
+        limiter._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache for openFDA responses.
+Entries are gzip-compressed JSON files named by a hash of the normalized
+query, so repeat searches are served locally instead of re-downloaded.
+Several processes (e.g. Dash background jobs) can share one directory.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+# MAUDE data on openFDA is refreshed weekly
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def normalize_query(search_query: str) -> str:
+    """
+    Canonical form of a search query for cache keys.
+
+    Whitespace is folded into `+` (the API treats both as spaces) and the
+    terms of a plain `+AND+` conjunction are sorted, so the same filters
+    written in a different order share an entry.
+    """
+    query = "+".join(search_query.split())
+    if "+OR+" in query or "(" in query:
+        return query
+    return "+AND+".join(sorted(query.split("+AND+")))
+
+
+class ResponseCache:
+    """
+    Content-addressed, size-bounded LRU cache of API responses on disk.
+
+    The directory is the source of truth: entries written by other
+    processes are served when asked for, and the in-memory index is
+    rebuilt before evicting whenever the directory changed behind it, so
+    `max_bytes` bounds the directory rather than one process's writes.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> size in bytes, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._dir_mtime = None  # directory mtime the index reflects
+        self._load_index()
+        _caches.add(self)
+
+    def _load_index(self):
+        self._entries.clear()
+        self._total_bytes = 0
+        self._dir_mtime = self.directory.stat().st_mtime_ns
+        stats = []
+        for path in self.directory.glob("*.json.gz"):
+            try:
+                stats.append((path, path.stat()))
+            except FileNotFoundError:
+                pass  # evicted by another process meanwhile
+        for path, stat in sorted(stats, key=lambda ps: ps[1].st_mtime):
+            self._entries[path.name[: -len(".json.gz")]] = stat.st_size
+            self._total_bytes += stat.st_size
+
+    def _sync(self):
+        # Rebuild the index if another process added or removed entries
+        if self.directory.stat().st_mtime_ns != self._dir_mtime:
+            self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json.gz"
+
+    @staticmethod
+    def make_key(search_query: str, limit: int, skip: int, **extra) -> str:
+        payload = {"search": normalize_query(search_query), "limit": limit, "skip": skip, **extra}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    # ── Lookup & store ────────────────────────────────────────────────────────
+
+    def get(self, search_query: str, limit: int, skip: int, **extra) -> dict | None:
+        """Return the cached response, or None if missing or older than the TTL."""
+        key = self.make_key(search_query, limit, skip, **extra)
+        path = self._path(key)
+        with self._lock:
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                self._total_bytes -= self._entries.pop(key, 0)
+                return None
+            except (OSError, ValueError):
+                self._drop(key)
+                return None
+            if key not in self._entries:
+                # Written by another process
+                self._entries[key] = path.stat().st_size
+                self._total_bytes += self._entries[key]
+            if time.time() - entry["stored_at"] > self.ttl_seconds:
+                self._drop(key)
+                return None
+            # Touch the file so recency survives restarts
+            os.utime(path)
+            self._entries.move_to_end(key)
+            return entry["response"]
+
+    def put(self, search_query: str, limit: int, skip: int, response: dict, **extra):
+        """Store a response and evict least recently used entries over the size bound."""
+        key = self.make_key(search_query, limit, skip, **extra)
+        path = self._path(key)
+        data = gzip.compress(
+            json.dumps({"stored_at": time.time(), "response": response}).encode("utf-8")
+        )
+        with self._lock:
+            self._sync()
+            tmp = path.with_suffix(f".tmp{os.getpid()}-{threading.get_ident()}")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+            # Our own changes are in the index already
+            self._dir_mtime = self.directory.stat().st_mtime_ns
+
+    def clear(self):
+        with self._lock:
+            self._sync()
+            for key in list(self._entries):
+                self._drop(key)
+            self._dir_mtime = self.directory.stat().st_mtime_ns
+
+    def _drop(self, key: str):
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    # ── Stats ─────────────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            self._sync()
+            return self._total_bytes
+
+
+# Every live cache, for _after_fork
+_caches: "weakref.WeakSet[ResponseCache]" = weakref.WeakSet()
+
+
+def _after_fork():
+    # A forked child (Dash background job) gets fresh locks and re-reads each
+    # index, which a thread of the parent may have been changing
+    for cache in list(_caches):
+        cache._lock = threading.Lock()
+        cache._dir_mtime = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
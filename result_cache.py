@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Server-side cache of search result DataFrames for the web UI.
+Callbacks store a result once and pass only its ID through dcc.Store, so the
+DataFrame never round-trips through the browser as JSON.
+"""
+
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+DEFAULT_MAX_MEMORY_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+class ResultCache:
+    """
+    LRU of DataFrames keyed by result ID, bounded by memory use.
+
+    Entries evicted from memory are spilled to `directory` as pickles and
+    promoted back on the next `get`; without a directory they are dropped.
+    Spilled files older than `ttl_seconds` are removed.
+
+    With `write_through`, every entry is written to `directory` as soon as
+    it is stored, so results put by other processes (e.g. Dash background
+    callback workers) can be read here.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path | None = None,
+        max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        write_through: bool = False,
+    ):
+        self.directory = Path(directory) if directory else None
+        self.write_through = write_through and self.directory is not None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # result ID -> (DataFrame, size in bytes), least recently used first
+        self._entries: OrderedDict[str, tuple[pd.DataFrame, int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._expire_spilled()
+        _caches.add(self)
+
+    def _path(self, result_id: str) -> Path:
+        return self.directory / f"{result_id}.pkl"
+
+    # ── Store & lookup ────────────────────────────────────────────────────────
+
+    def put(self, df: pd.DataFrame) -> str:
+        """Store a DataFrame and return its result ID."""
+        result_id = uuid.uuid4().hex
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if self.write_through:
+                self._write(result_id, df)
+                self._expire_spilled()
+            self._entries[result_id] = (df, size)
+            self._memory_bytes += size
+            self._evict()
+        return result_id
+
+    def get(self, result_id: str | None) -> pd.DataFrame | None:
+        """Return the DataFrame for a result ID, or None if it has expired."""
+        if not result_id:
+            return None
+        with self._lock:
+            if result_id in self._entries:
+                self._entries.move_to_end(result_id)
+                return self._entries[result_id][0]
+            if not self.directory or not result_id.isalnum():
+                return None
+            path = self._path(result_id)
+            try:
+                df = pd.read_pickle(path)
+            except (OSError, EOFError, ValueError):
+                return None
+            if not self.write_through:
+                path.unlink(missing_ok=True)
+            size = int(df.memory_usage(deep=True).sum())
+            self._entries[result_id] = (df, size)
+            self._memory_bytes += size
+            self._evict(keep=result_id)
+            return df
+
+    def _evict(self, keep: str | None = None):
+        # Always keep the newest entry in memory, even if it alone is over budget
+        spilled = False
+        while self._memory_bytes > self.max_memory_bytes and len(self._entries) > 1:
+            result_id = next(iter(self._entries))
+            if result_id == keep:
+                self._entries.move_to_end(result_id)
+                continue
+            df, size = self._entries.pop(result_id)
+            self._memory_bytes -= size
+            if self.directory and not self.write_through:
+                self._write(result_id, df)
+                spilled = True
+        if spilled:
+            self._expire_spilled()
+
+    def _write(self, result_id: str, df: pd.DataFrame):
+        tmp = self._path(result_id).with_suffix(f".tmp{os.getpid()}")
+        df.to_pickle(tmp)
+        os.replace(tmp, self._path(result_id))
+
+    def _expire_spilled(self):
+        if not self.directory:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for path in self.directory.glob("*.pkl"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    # ── Stats ─────────────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+
+# Every live cache, for _reset_locks
+_caches: "weakref.WeakSet[ResultCache]" = weakref.WeakSet()
+
+
+def _reset_locks():
+    # Background jobs are forked; a child must not inherit a held lock
+    for cache in list(_caches):
+        cache._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Background scheduler for subscriptions.
+Runs each subscription on the cadence of its source: US subscriptions weekly,
+the day after the Wednesday MAUDE update, and Canada subscriptions daily.
+Next-run times are saved with the subscriptions, so restarts keep the
+schedule, and hits are kept as pending until the subscription is viewed.
+
+The web UI starts a scheduler thread itself (SUB_SCHEDULER=0 turns it off);
+to run it in its own process instead:
+
+    python scheduler.py
+"""
+
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+
+from subscriptions import SUBS_DB, SubRun, SubscriptionStore, make_fetchers, record_runs, run_all
+
+
+class SubscriptionScheduler:
+    """
+    Runs due subscriptions from a daemon thread.
+
+    Every `poll_seconds` the subscriptions whose `next_run` has passed are
+    run together through `run_all`, at most `workers` fetches at a time.
+    Each run's next slot is `run_hour` on the following day (Canada) or on
+    the next `us_weekday` (US), plus up to `jitter_minutes` so runs do not
+    all start at once. Failed and capped runs are retried after
+    `retry_minutes`. New subscriptions run on the first poll.
+
+    Canada runs match against a current feed, even when `canada_fetcher`
+    serves searches from the previous index while it refreshes (the UI's).
+    """
+
+    def __init__(
+        self,
+        fetcher,
+        canada_fetcher,
+        store: SubscriptionStore,
+        us_weekday: int = 3,        # Thursday (Monday = 0)
+        run_hour: int = 6,
+        jitter_minutes: float = 30,
+        workers: int = 2,
+        retry_minutes: float = 60,
+        poll_seconds: float = 60,
+    ):
+        self.fetcher = fetcher
+        self.canada_fetcher = canada_fetcher
+        self.store = store
+        self.us_weekday = us_weekday
+        self.run_hour = run_hour
+        self.jitter_minutes = jitter_minutes
+        self.workers = workers
+        self.retry_minutes = retry_minutes
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def from_env(cls, fetcher, canada_fetcher, store: SubscriptionStore, **kwargs) -> "SubscriptionScheduler":
+        return cls(
+            fetcher,
+            canada_fetcher,
+            store,
+            us_weekday=int(os.getenv("SUB_US_WEEKDAY", 3)),
+            run_hour=int(os.getenv("SUB_RUN_HOUR", 6)),
+            jitter_minutes=float(os.getenv("SUB_JITTER_MINUTES", 30)),
+            workers=int(os.getenv("SUB_SCHEDULER_WORKERS", 2)),
+            retry_minutes=float(os.getenv("SUB_RETRY_MINUTES", 60)),
+            **kwargs,
+        )
+
+    # ── Schedule ──────────────────────────────────────────────────────────────
+
+    def next_run(self, sub: dict, after: datetime) -> datetime:
+        """The first slot for `sub` strictly after `after`, with jitter."""
+        slot = after.replace(hour=self.run_hour, minute=0, second=0, microsecond=0)
+        if sub.get("country", "US") == "Canada":
+            period = timedelta(days=1)
+        else:
+            period = timedelta(days=7)
+            slot += timedelta(days=(self.us_weekday - slot.weekday()) % 7)
+        while slot <= after:
+            slot += period
+        return slot + timedelta(minutes=random.uniform(0, self.jitter_minutes))
+
+    def _scheduled(self, sub: dict, now: datetime) -> datetime:
+        if sub.get("next_run"):
+            return datetime.fromisoformat(sub["next_run"])
+        if sub.get("last_run"):
+            return self.next_run(sub, datetime.fromisoformat(sub["last_run"]))
+        return now
+
+    # ── Running ───────────────────────────────────────────────────────────────
+
+    def tick(self, now: datetime | None = None) -> list[SubRun]:
+        """Run every subscription that is due and save the next run times."""
+        now = now or datetime.now()
+        due, schedule = [], {}
+        for sub in self.store.all():
+            when = self._scheduled(sub, now)
+            if when <= now:
+                due.append(sub)
+            elif not sub.get("next_run"):
+                schedule[sub["id"]] = {"next_run": when.isoformat()}
+
+        runs = run_all(due, self.fetcher, self.canada_fetcher, workers=self.workers) if due else []
+        for run in runs:
+            if run.error or run.more:
+                when = now + timedelta(minutes=self.retry_minutes)
+            else:
+                when = self.next_run(run.sub, now)
+            schedule[run.sub["id"]] = {"next_run": when.isoformat()}
+        if runs or schedule:
+            record_runs(runs, self.store, keep_hits=True, extra=schedule)
+        for run in runs:
+            name = run.sub.get("name", run.sub["id"])
+            print(f"Scheduled run of '{name}': " + (f"error: {run.error}" if run.error else f"{run.count} new"))
+        return runs
+
+    def _loop(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Scheduled subscription run failed: {e}")
+            if self._stop.wait(self.poll_seconds):
+                return
+
+    def start(self) -> "SubscriptionScheduler":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="subscription-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main():
+    scheduler = SubscriptionScheduler.from_env(*make_fetchers(), SubscriptionStore(os.getenv("SUBS_DB", SUBS_DB)))
+    print(f"Running subscriptions from {scheduler.store.path}; Ctrl+C to stop")
+    scheduler.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
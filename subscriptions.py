@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+"""
+Saved searches ("subscriptions") over MAUDE and the Health Canada recalls.
+Subscriptions live in subscriptions.db; each run reports what is new since
+the last one. `run_all` runs every subscription in one batch: US
+subscriptions are answered by as few shared superset fetches as possible
+(see `plan_fetches`), and Canada subscriptions all search one snapshot of
+the feed.
+
+    python subscriptions.py run-all          # e.g. from cron
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from maude_api_fetch import MAUDEFetcher, dedupe_results
+from maude_warehouse import OUTCOME_FIELD, report_predicate
+
+# Pre-database storage, imported on first use of a new database
+SUBS_FILE = Path(__file__).parent / "subscriptions.json"
+
+# US subscriptions only fetch reports received since their watermark: the latest
+# date_received already seen, plus the report numbers seen on that date (later
+# reports can still arrive for it). Results come oldest first, so a run capped
+# at SUB_BATCH leaves a complete prefix and the next run carries on from there,
+# passing over the reports it has seen rather than counting them, since the API
+# does not order reports received on one day the same way every time.
+SUB_INITIAL_DAYS = 90
+SUB_BATCH        = 1000
+
+# Subscriptions OR-ed into one API query; bounds the URL length
+SUB_GROUP_SIZE = 10
+
+# Query fields with few distinct values, cheaper to filter locally than to
+# fetch separately: subscriptions differing only in these share one fetch
+LOCAL_FIELDS = {"event_type", OUTCOME_FIELD}
+
+# Values of patient.sequence_number_outcome the API can filter on. Any other
+# outcome is matched locally, reading at most SUB_SCAN_LIMIT reports a run.
+OUTCOME_VALUES = ["Death", "Hospitalization", "Life Threatening", "Required Intervention",
+                  "Disability", "Congenital Anomaly", "Other"]
+SUB_SCAN_LIMIT = 10 * SUB_BATCH
+
+# Column of the hits DataFrame identifying a hit in sub_hits
+HIT_KEYS = {"US": "report_number", "Canada": "recall_id"}
+
+
+# ── Storage ───────────────────────────────────────────────────────────────────
+# Subscriptions live in SQLite (WAL mode) so runs, the scheduler and UI
+# callbacks update single rows instead of rewriting one shared file.
+# subscriptions.json, the earlier format, is imported once into a new database.
+
+SUBS_DB = Path(__file__).parent / "subscriptions.db"
+
+# Bump when the table layout changes (stored as PRAGMA user_version)
+STORE_SCHEMA_VERSION = 2
+
+_COLUMNS = ("id", "country", "name", "created", "last_run", "next_run", "hit_count", "pending", "watermark")
+
+
+class SubscriptionStore:
+    """
+    SQLite-backed subscriptions, returned as dicts in the shape the UI has
+    always used: filter fields (device, product, ...) sit alongside id,
+    name, country, created, last_run, next_run, hit_count, pending and
+    watermark. Connections are per thread and per process.
+
+    The sub_hits table records every hit a subscription has produced (MAUDE
+    report number or recall NID), with the run that first saw it.
+    """
+
+    def __init__(self, path: str | Path = SUBS_DB, json_path: Path | None = SUBS_FILE):
+        self.path = Path(path)
+        self._local = threading.local()
+        with self._connect() as db:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS subscriptions (
+                        id        TEXT PRIMARY KEY,
+                        country   TEXT NOT NULL DEFAULT 'US',
+                        name      TEXT NOT NULL DEFAULT '',
+                        created   TEXT NOT NULL DEFAULT '',
+                        last_run  TEXT NOT NULL DEFAULT '',
+                        next_run  TEXT,
+                        hit_count INTEGER NOT NULL DEFAULT 0,
+                        pending   INTEGER NOT NULL DEFAULT 0,
+                        watermark TEXT,
+                        filters   TEXT NOT NULL DEFAULT '{}'
+                    )""")
+                db.execute("CREATE INDEX IF NOT EXISTS subscriptions_country ON subscriptions (country)")
+                if json_path is not None and json_path.exists():
+                    self._import_json(db, json_path)
+            if version < 2:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS sub_hits (
+                        sub_id     TEXT NOT NULL,
+                        hit_key    TEXT NOT NULL,
+                        first_seen TEXT NOT NULL,
+                        run_id     TEXT NOT NULL,
+                        PRIMARY KEY (sub_id, hit_key)
+                    ) WITHOUT ROWID""")
+                db.execute("CREATE INDEX IF NOT EXISTS sub_hits_run ON sub_hits (sub_id, run_id)")
+            if version < STORE_SCHEMA_VERSION:
+                db.execute(f"PRAGMA user_version = {STORE_SCHEMA_VERSION}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not cross threads, or a fork (Dash workers)
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _import_json(self, db: sqlite3.Connection, json_path: Path):
+        try:
+            subs = json.loads(json_path.read_text())
+        except (OSError, ValueError):
+            return
+        for sub in subs:
+            db.execute(*self._insert(sub))
+        print(f"Imported {len(subs)} subscriptions from {json_path} into {self.path}")
+
+    @staticmethod
+    def _insert(sub: dict) -> tuple[str, tuple]:
+        row = {c: sub.get(c) for c in _COLUMNS}
+        row.update(
+            country=sub.get("country", "US"), name=sub.get("name", ""), created=sub.get("created", ""),
+            last_run=sub.get("last_run", ""), next_run=sub.get("next_run") or None,
+            hit_count=sub.get("hit_count", 0), pending=sub.get("pending", 0),
+            watermark=json.dumps(sub["watermark"]) if sub.get("watermark") else None,
+        )
+        filters = {k: v for k, v in sub.items() if k not in _COLUMNS}
+        return (
+            f"INSERT OR REPLACE INTO subscriptions ({', '.join(_COLUMNS)}, filters) "
+            f"VALUES ({', '.join('?' * (len(_COLUMNS) + 1))})",
+            (*row.values(), json.dumps(filters)),
+        )
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        sub = {"id": row["id"], "name": row["name"], "country": row["country"], **json.loads(row["filters"]),
+               "created": row["created"], "last_run": row["last_run"], "hit_count": row["hit_count"],
+               "pending": row["pending"]}
+        if row["next_run"]:
+            sub["next_run"] = row["next_run"]
+        if row["watermark"]:
+            sub["watermark"] = json.loads(row["watermark"])
+        return sub
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def all(self, country: str | None = None) -> list[dict]:
+        """Subscriptions in creation order, optionally for one country."""
+        if country:
+            rows = self._connect().execute("SELECT * FROM subscriptions WHERE country = ? ORDER BY rowid", (country,))
+        else:
+            rows = self._connect().execute("SELECT * FROM subscriptions ORDER BY rowid")
+        return [self._to_dict(r) for r in rows]
+
+    def get(self, sub_id: str) -> dict | None:
+        row = self._connect().execute("SELECT * FROM subscriptions WHERE id = ?", (sub_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def add(self, sub: dict):
+        with self._connect() as db:
+            db.execute(*self._insert(sub))
+
+    def delete(self, sub_id: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM subscriptions WHERE id = ?", (sub_id,))
+            db.execute("DELETE FROM sub_hits WHERE sub_id = ?", (sub_id,))
+
+    def update(self, sub_id: str, **fields):
+        """Set columns of one subscription (not its filters)."""
+        unknown = set(fields) - set(_COLUMNS[1:])
+        if unknown:
+            raise ValueError(f"Cannot update subscription fields: {', '.join(sorted(unknown))}")
+        if "watermark" in fields:
+            fields["watermark"] = json.dumps(fields["watermark"]) if fields["watermark"] else None
+        if fields:
+            with self._connect() as db:
+                db.execute(
+                    f"UPDATE subscriptions SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                    (*fields.values(), sub_id),
+                )
+
+    # ── Hits ──────────────────────────────────────────────────────────────────
+
+    def add_hits(self, sub_id: str, keys, run_id: str, first_seen: str) -> set[str]:
+        """
+        Record a run's hit keys and return those the subscription has not
+        had before, found by an anti-join against its sub_hits rows.
+        """
+        with self._connect() as db:
+            # Take the write lock before reading, so a concurrent run of the
+            # same subscription (Run Now beside the scheduler) waits here
+            # instead of inserting the same keys or failing to upgrade its lock
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("CREATE TEMP TABLE IF NOT EXISTS run_keys (hit_key TEXT PRIMARY KEY)")
+            db.execute("DELETE FROM run_keys")
+            db.executemany("INSERT OR IGNORE INTO run_keys VALUES (?)", ((str(k),) for k in keys))
+            new = {row[0] for row in db.execute(
+                "SELECT k.hit_key FROM run_keys k LEFT JOIN sub_hits h"
+                " ON h.sub_id = ? AND h.hit_key = k.hit_key WHERE h.hit_key IS NULL",
+                (sub_id,),
+            )}
+            db.executemany(
+                "INSERT INTO sub_hits (sub_id, hit_key, first_seen, run_id) VALUES (?, ?, ?, ?)",
+                ((sub_id, key, first_seen, run_id) for key in new),
+            )
+        return new
+
+    def hits(self, sub_id: str, run_id: str | None = None) -> pd.DataFrame:
+        """Recorded hits of a subscription (hit_key, first_seen, run_id), newest first."""
+        query, params = "SELECT hit_key, first_seen, run_id FROM sub_hits WHERE sub_id = ?", [sub_id]
+        if run_id:
+            query += " AND run_id = ?"
+            params.append(run_id)
+        return pd.read_sql_query(query + " ORDER BY first_seen DESC", self._connect(), params=params)
+
+    def record_run(self, sub_id: str, last_run: str, count: int, watermark: dict | None = None,
+                   pending: int | None = None):
+        """Stamp a run and add its hits to the total in one statement."""
+        with self._connect() as db:
+            db.execute(
+                "UPDATE subscriptions SET last_run = ?, hit_count = hit_count + ?,"
+                " watermark = COALESCE(?, watermark), pending = COALESCE(?, pending) WHERE id = ?",
+                (last_run, count, json.dumps(watermark) if watermark else None, pending, sub_id),
+            )
+
+
+# ── Queries & watermarks ──────────────────────────────────────────────────────
+
+def outcome_term(sub: dict) -> str:
+    """Query term for the subscription's outcome, or "" if the API cannot filter on it."""
+    outcome = (sub.get("outcome") or "").strip()
+    value = {v.lower(): v for v in OUTCOME_VALUES}.get(outcome.lower())
+    return f'{OUTCOME_FIELD}:"{value.replace(" ","+")}"' if value else ""
+
+
+def sub_to_query(sub: dict, pushdown: bool = True) -> str:
+    """The subscription's query; with `pushdown`, including its outcome where possible."""
+    parts = []
+    if sub.get("device"):
+        parts.append(f'device.generic_name:"{sub["device"].strip().replace(" ","+")}"')
+    if sub.get("manufacturer"):
+        parts.append(f'device.manufacturer_d_name:"{sub["manufacturer"].strip().replace(" ","+")}"')
+    if sub.get("event_type"):
+        parts.append(f'event_type:"{sub["event_type"]}"')
+    if pushdown and outcome_term(sub):
+        parts.append(outcome_term(sub))
+    return "+AND+".join(parts)
+
+
+def canada_filters(sub: dict) -> dict:
+    """Keyword arguments for CanadaRecallsFetcher.search / RecallIndex.search."""
+    return {
+        "product": sub.get("product", ""),
+        "category": sub.get("category", ""),
+        "recall_class": sub.get("recall_class", ""),
+        "issue": sub.get("issue", ""),
+        "include_archived": False,
+    }
+
+
+def sub_window_start(sub: dict) -> str:
+    wm = sub.get("watermark")
+    if wm and wm.get("date_received"):
+        return wm["date_received"]
+    return (date.today() - timedelta(days=SUB_INITIAL_DAYS)).strftime("%Y%m%d")
+
+
+def seen_numbers(sub: dict) -> set[str]:
+    """
+    Report numbers already read on the subscription's watermark date. Runs
+    re-read that date and read past these, so a date with more than
+    SUB_BATCH reports still moves on from one run to the next.
+    """
+    return set((sub.get("watermark") or {}).get("report_numbers", []))
+
+
+def take_new_hits(sub: dict, results: list[dict], scanned: list[dict] | None = None) -> list[dict]:
+    """
+    Return reports this subscription has not seen yet and advance its watermark.
+    When `results` were filtered locally from `scanned` (everything read, in
+    order), the watermark advances past everything scanned.
+
+    Pages can order the reports of one date_received differently, so a
+    date split across pages may come back with some reports twice and
+    others missing. The watermark stops at the first date read past that
+    is short of distinct reports, and results after it are left for the
+    next run.
+    """
+    wm    = sub.get("watermark") or {"date_received": "", "report_numbers": []}
+    seen  = set(wm["report_numbers"])
+    scanned = results if scanned is None else scanned
+    by_date: dict[str, list] = defaultdict(list)
+    for r in scanned:
+        by_date[r.get("date_received") or ""].append(r.get("report_number"))
+    latest = max(by_date, default="")
+    for day in sorted(by_date):
+        numbers = by_date[day]
+        known   = set(numbers) | (seen if day == wm["date_received"] else set())
+        if day < latest and len(known) < len(numbers):
+            latest = day
+            break
+    fresh = [r for r in dedupe_results(results)
+             if r.get("report_number") not in seen and (r.get("date_received") or "") <= latest]
+    if latest and latest >= wm["date_received"]:
+        at_latest = set(by_date[latest])
+        if latest == wm["date_received"]:
+            at_latest |= seen
+        sub["watermark"] = {"date_received": latest, "report_numbers": sorted(at_latest - {None})}
+    return fresh
+
+
+# ── Running ───────────────────────────────────────────────────────────────────
+
+@dataclass
+class SubRun:
+    """Outcome of running one subscription."""
+
+    sub: dict
+    hits: pd.DataFrame = field(default_factory=pd.DataFrame)
+    since: str = ""     # US: first date_received covered, YYYY-MM-DD
+    more: bool = False  # US: the fetch was capped; the next run continues
+    error: str = ""
+    run_id: str = ""    # set by record_runs
+
+
+    @property
+    def count(self) -> int:
+        return len(self.hits)
+
+
+def _us_run(sub: dict, fetched: list[dict], window: str, capped: bool, fetcher,
+            scanned: list[dict] | None = None) -> SubRun:
+    read_to = max((r.get("date_received") or "" for r in (fetched if scanned is None else scanned)), default="")
+    results = take_new_hits(sub, fetched, scanned)
+    return SubRun(
+        sub,
+        hits=fetcher.parse_to_dataframe(results) if results else pd.DataFrame(),
+        since=datetime.strptime(window, "%Y%m%d").date().isoformat(),
+        # The watermark stopped short of what was read (see take_new_hits)
+        more=capped or (sub.get("watermark") or {}).get("date_received", "") < read_to,
+    )
+
+
+def _split_outcome(sub: dict, fetcher) -> tuple[str, str]:
+    # (query to fetch, outcome left to filter locally): the outcome goes into
+    # the query when the API can evaluate it; the local warehouse cannot
+    pushdown = isinstance(fetcher, MAUDEFetcher)
+    outcome  = (sub.get("outcome") or "").strip()
+    if pushdown and outcome_term(sub):
+        outcome = ""
+    return sub_to_query(sub, pushdown), outcome
+
+
+def _pages(search_query: str, fetcher, max_results: int | None = None):
+    # A query's results oldest first, page by page
+    if hasattr(fetcher, "iter_pages"):
+        return fetcher.iter_pages(search_query, max_results=max_results, sort="date_received:asc")
+    return [fetcher.fetch_all(search_query, max_results=max_results)]  # local scans are cheap
+
+
+def _scan_for_outcome(search_query: str, outcome: str, fetcher, seen: set[str]) -> tuple[list[dict], list[dict], bool]:
+    """
+    Read a query oldest first, keeping reports not in `seen` where any
+    patient has `outcome`, as the API matches an outcome term, until
+    SUB_BATCH match or SUB_SCAN_LIMIT unseen reports have been read.
+
+    Returns (reports read, matching reports, whether reading stopped early).
+    """
+    value = outcome.replace('"', "").replace(" ", "+")
+    has_outcome = report_predicate(f'{OUTCOME_FIELD}:"{value}"')
+    scanned, matching, unseen = [], [], 0
+    for page in _pages(search_query, fetcher):
+        for report in page:
+            scanned.append(report)
+            if report.get("report_number") in seen:
+                continue
+            unseen += 1
+            if has_outcome(report):
+                matching.append(report)
+                if len(matching) >= SUB_BATCH:
+                    # Stop right after the last match that fits, so the watermark covers no more
+                    return scanned, matching, True
+        if unseen >= SUB_SCAN_LIMIT:
+            return scanned, matching, True
+    return scanned, matching, False
+
+
+def run_us(sub: dict, fetcher) -> SubRun:
+    query, outcome = _split_outcome(sub, fetcher)
+    if not query and not outcome:
+        return SubRun(sub, error="Subscription has no valid filters.")
+    window = sub_window_start(sub)
+    full_q = "+AND+".join(filter(None, [f"date_received:[{window}+TO+{date.today():%Y%m%d}]", query]))
+    seen   = seen_numbers(sub)
+    if outcome:
+        scanned, fetched, capped = _scan_for_outcome(full_q, outcome, fetcher, seen)
+        return _us_run(sub, fetched, window, capped, fetcher, scanned)
+    # The seen reports come first, in whatever order: read past them
+    scanned, fetched = [], []
+    for page in _pages(full_q, fetcher, SUB_BATCH + len(seen)):
+        for report in page:
+            if len(fetched) >= SUB_BATCH:
+                break
+            scanned.append(report)
+            if report.get("report_number") not in seen:
+                fetched.append(report)
+    return _us_run(sub, fetched, window, len(fetched) >= SUB_BATCH, fetcher, scanned)
+
+
+def run_canada(sub: dict, recalls) -> SubRun:
+    """`recalls` is a CanadaRecallsFetcher or a RecallIndex snapshot of it."""
+    return SubRun(sub, hits=recalls.search(**canada_filters(sub)))
+
+
+def run_subscription(sub: dict, fetcher, canada_fetcher) -> SubRun:
+    """Run one subscription, advancing its watermark (see `record_runs`)."""
+    if sub.get("country", "US") == "Canada":
+        return run_canada(sub, canada_fetcher)
+    return run_us(sub, fetcher)
+
+
+@dataclass
+class FetchPlan:
+    """One API fetch shared by several US subscriptions."""
+
+    window: str          # earliest date_received any of the subscriptions needs
+    queries: list[str]   # superset queries, OR-ed together
+    subs: list[dict]
+
+    @property
+    def search_query(self) -> str:
+        either = "+OR+".join(f"({q})" for q in self.queries)
+        return f"date_received:[{self.window}+TO+{date.today():%Y%m%d}]+AND+({either})"
+
+
+def plan_fetches(subs: list[dict]) -> list[FetchPlan]:
+    """
+    Plan as few fetches as possible for US subscriptions.
+
+    Subscriptions whose queries only differ in LOCAL_FIELDS clauses share
+    a superset query of their common clauses, over the earliest window any
+    of them needs. Queries with the same window are then OR-ed together,
+    SUB_GROUP_SIZE per fetch. A subscription sharing its superset with no
+    other, or with nothing but LOCAL_FIELDS clauses, keeps its own query.
+    """
+    supersets: dict[str, list[dict]] = defaultdict(list)
+    for sub in subs:
+        terms  = sub_to_query(sub).split("+AND+")
+        shared = "+AND+".join(sorted(t for t in terms if t.split(":", 1)[0] not in LOCAL_FIELDS))
+        supersets[shared or sub_to_query(sub)].append(sub)
+
+    windows: dict[str, list[tuple[str, list[dict]]]] = defaultdict(list)
+    for query, group in supersets.items():
+        if len(group) == 1:
+            query = sub_to_query(group[0])
+        windows[min(sub_window_start(s) for s in group)].append((query, group))
+
+    plans = []
+    for window, entries in windows.items():
+        for i in range(0, len(entries), SUB_GROUP_SIZE):
+            chunk = entries[i:i + SUB_GROUP_SIZE]
+            plans.append(FetchPlan(window, [q for q, _ in chunk], [s for _, g in chunk for s in g]))
+    return plans
+
+
+def _run_plan(plan: FetchPlan, fetcher) -> list[SubRun]:
+    """
+    Read the plan's query oldest first, matching each report against every
+    subscription's own query, until each subscription has SUB_BATCH
+    matches it has not seen, or the API's skip ceiling is reached. A
+    subscription's watermark advances over what was read for it, matches or
+    not, so a run with none still makes progress; the reports it read on
+    its last date count as seen, like those of an outcome scan.
+    """
+    today    = f"{date.today():%Y%m%d}"
+    windows  = [sub_window_start(sub) for sub in plan.subs]
+    seen     = [seen_numbers(sub) for sub in plan.subs]
+    matchers = [report_predicate(f"date_received:[{w}+TO+{today}]+AND+{sub_to_query(sub)}")
+                for sub, w in zip(plan.subs, windows)]
+    matching = [[] for _ in plan.subs]
+    spans    = [[0, 0] for _ in plan.subs]  # the part of `read` each subscription scanned
+    ceiling  = fetcher.MAX_SKIP + fetcher.PAGE_SIZE
+    read     = []
+    for page in _pages(plan.search_query, fetcher, max_results=ceiling):
+        for report in page:
+            read.append(report)
+            received = report.get("date_received") or ""
+            for i, matches in enumerate(matchers):
+                if len(matching[i]) < SUB_BATCH and received >= windows[i]:
+                    if spans[i][1] == 0:
+                        spans[i][0] = len(read) - 1
+                    spans[i][1] = len(read)
+                    if matches(report) and report.get("report_number") not in seen[i]:
+                        matching[i].append(report)
+        if all(len(m) >= SUB_BATCH for m in matching):
+            break
+    stopped = len(read) >= ceiling  # the rest of the window is left for the next run
+    return [
+        _us_run(sub, m, w, stopped or len(m) >= SUB_BATCH, fetcher, read[start:end])
+        for sub, m, w, (start, end) in zip(plan.subs, matching, windows, spans)
+    ]
+
+
+def run_all(subs: list[dict], fetcher, canada_fetcher, workers: int | None = None) -> list[SubRun]:
+    """
+    Run every subscription, returning one SubRun per subscription in order.
+
+    US subscriptions are fetched as planned by `plan_fetches` and matched
+    back to their subscriptions locally; the fetches run concurrently.
+    With the local warehouse backend, which does not evaluate OR queries,
+    each runs on its own. Canada subscriptions all run against one index,
+    waiting for the feed to be current first.
+    """
+    runs: dict[str, SubRun] = {}
+    tasks = []
+
+    canada = [s for s in subs if s.get("country", "US") == "Canada"]
+
+    def run_canada_all():
+        # One current snapshot of the feed for all of them
+        index = canada_fetcher.index(fresh=True)
+        return [run_canada(s, index) for s in canada]
+
+    if canada:
+        tasks.append((canada, run_canada_all))
+
+    shared = []
+    for sub in subs:
+        if sub.get("country", "US") == "Canada":
+            continue
+        query, outcome = _split_outcome(sub, fetcher)
+        if not query and not outcome:
+            runs[sub["id"]] = SubRun(sub, error="Subscription has no valid filters.")
+        elif isinstance(fetcher, MAUDEFetcher) and not outcome:
+            shared.append(sub)
+        else:
+            tasks.append(([sub], lambda sub=sub: [run_us(sub, fetcher)]))
+    for plan in plan_fetches(shared):
+        tasks.append((plan.subs, lambda plan=plan: _run_plan(plan, fetcher)))
+
+    workers = workers or getattr(fetcher, "max_workers", 1)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [(group, pool.submit(task)) for group, task in tasks]
+        for group, future in futures:
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [SubRun(s, error=str(e)) for s in group]
+            runs.update((run.sub["id"], run) for run in results)
+    return [runs[s["id"]] for s in subs]
+
+
+def record_runs(runs: list[SubRun], store: SubscriptionStore, keep_hits: bool = False,
+                extra: dict[str, dict] | None = None):
+    """
+    Save run times, hit counts and watermarks of successful runs, one row
+    at a time, so edits made while the runs were in flight are kept.
+
+    Each run's hits are recorded in sub_hits and narrowed to the ones the
+    subscription has not had before; only those are counted and kept.
+    With `keep_hits`, they are also kept as pending for the user to see
+    on their next Run Now (for runs nobody is watching, e.g. scheduled).
+    `extra` maps subscription IDs to further columns to set.
+    """
+    now, run_id = datetime.now().isoformat(), uuid.uuid4().hex
+    for run in runs:
+        if run.error:
+            continue
+        run.run_id = run_id
+        if run.count:
+            key = HIT_KEYS[run.sub.get("country", "US")]
+            new = store.add_hits(run.sub["id"], run.hits[key].dropna(), run_id, now)
+            run.hits = run.hits[run.hits[key].astype(str).isin(new)].reset_index(drop=True)
+        store.record_run(run.sub["id"], now, run.count, run.sub.get("watermark"),
+                         _keep_pending(run) if keep_hits else None)
+    for sub_id, fields in (extra or {}).items():
+        store.update(sub_id, **fields)
+
+
+# ── Pending hits ──────────────────────────────────────────────────────────────
+# Hits found by unattended runs, kept until the subscription is next viewed.
+
+PENDING_DIR = Path(__file__).parent / ".sub_pending"
+
+
+def _pending_path(sub_id: str) -> Path:
+    return PENDING_DIR / f"{sub_id}.pkl"
+
+
+def _read_pending(sub_id: str) -> pd.DataFrame:
+    try:
+        return pd.read_pickle(_pending_path(sub_id))
+    except (OSError, EOFError, ValueError):
+        return pd.DataFrame()
+
+
+def _keep_pending(run: SubRun) -> int:
+    sub_id = run.sub["id"]
+    hits = pd.concat([_read_pending(sub_id), run.hits], ignore_index=True)
+    if hits.empty:
+        _pending_path(sub_id).unlink(missing_ok=True)
+        return 0
+    PENDING_DIR.mkdir(parents=True, exist_ok=True)
+    # Replaced whole, so a concurrent take_pending never reads a partial file
+    tmp = _pending_path(sub_id).with_suffix(f".tmp{os.getpid()}-{threading.get_ident()}")
+    hits.to_pickle(tmp)
+    os.replace(tmp, _pending_path(sub_id))
+    return len(hits)
+
+
+def take_pending(sub_id: str) -> pd.DataFrame:
+    """Pending hits of a subscription, removing them (reset its `pending` count too)."""
+    hits = _read_pending(sub_id)
+    _pending_path(sub_id).unlink(missing_ok=True)
+    return hits
+
+
+def make_fetchers():
+    """(MAUDE fetcher, Canada fetcher) configured from the environment like the UI's."""
+    from dotenv import load_dotenv
+    from canada_fetch import CanadaRecallsFetcher
+    from rate_limit import RateLimiter
+
+    load_dotenv()
+    # Share the API quota with the UI and any other worker
+    RateLimiter.share_state(os.getenv("RATE_LIMIT_DIR", str(Path(__file__).parent / ".rate_limit")))
+    if os.getenv("MAUDE_BACKEND", "api") == "local":
+        from maude_warehouse import LocalMAUDEFetcher
+        fetcher = LocalMAUDEFetcher(os.getenv("MAUDE_WAREHOUSE_DIR", str(Path(__file__).parent / "maude_warehouse")))
+    else:
+        fetcher = MAUDEFetcher(api_key=os.getenv("FDA_API_KEY"))
+    canada_dir = os.getenv("CANADA_SNAPSHOT_DIR", str(Path(__file__).parent / ".canada_cache"))
+    return fetcher, CanadaRecallsFetcher(snapshot_dir=canada_dir or None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run-all", help="run every subscription and record new hits")
+    run.add_argument("--db", type=Path, help=f"subscription database (default: $SUBS_DB or {SUBS_DB.name})")
+    args = parser.parse_args()
+
+    fetchers = make_fetchers()
+    store = SubscriptionStore(args.db or os.getenv("SUBS_DB", SUBS_DB))
+    runs  = run_all(store.all(), *fetchers)
+    record_runs(runs, store, keep_hits=True)
+    for r in runs:
+        status = f"error: {r.error}" if r.error else f"{r.count} new" + (" (more pending)" if r.more else "")
+        print(f"{r.sub.get('name', r.sub['id'])}: {status}")
+
+
+if __name__ == "__main__":
+    main()
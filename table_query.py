@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Server-side filtering, sorting and paging for Dash DataTables.
+Tables run with page_action / sort_action / filter_action set to "custom";
+their callbacks pass the table's filter_query, sort_by and page settings
+here, and only the requested page of rows is sent to the browser.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# One clause of a DataTable filter_query, e.g. `{event_type} scontains "Death"`.
+# Operators may carry an `s` (case-sensitive) or `i` (insensitive) prefix.
+CLAUSE_RE = re.compile(
+    r"""^\{(?P<column>[^}]+)\}\s+
+        (?P<op>is\s+(?:not\s+)?(?:blank|nil)
+           |[si]?(?:contains|datestartswith|eq|ne|lt|le|gt|ge)
+           |[si]?(?:!=|<=|>=|=|<|>))
+        (?:\s+(?P<value>.+))?$""",
+    re.VERBOSE,
+)
+
+SYMBOLS = {"=": "eq", "!=": "ne", "<": "lt", "<=": "le", ">": "gt", ">=": "ge"}
+
+
+def parse_filter(filter_query: str) -> list[tuple[str, str, bool | None, str]]:
+    """
+    Split a filter_query into (column, operator, case_sensitive, value)
+    clauses. case_sensitive is None when the operator had no prefix.
+    Clauses that cannot be parsed are skipped, as the native filter does.
+    """
+    clauses = []
+    for part in (filter_query or "").split(" && "):
+        match = CLAUSE_RE.match(part.strip())
+        if not match:
+            continue
+        op = " ".join(match["op"].split())
+        case = None
+        if op[0] in "si" and not op.startswith("is "):
+            case, op = op[0] == "s", op[1:]
+        op = SYMBOLS.get(op, op)
+        value = (match["value"] or "").strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'`":
+            value = value[1:-1].replace("\\" + value[0], value[0])
+        clauses.append((match["column"], op, case, value))
+    return clauses
+
+
+def _clause_mask(series: pd.Series, op: str, case: bool, value: str) -> np.ndarray:
+    if op.startswith("is "):
+        blank = series.isna().to_numpy()
+        if op.endswith("blank"):
+            blank = blank | (series.astype(str).str.strip() == "").to_numpy()
+        return ~blank if " not " in op else blank
+
+    if pd.api.types.is_numeric_dtype(series) and op not in ("contains", "datestartswith"):
+        try:
+            number = float(value)
+        except ValueError:
+            return np.zeros(len(series), dtype=bool)
+        text, target = series, number
+    else:
+        text, target = series.fillna("").astype(str), value
+        if not case:
+            text, target = text.str.lower(), target.lower()
+
+    if op == "contains":
+        result = text.str.contains(target, regex=False)
+    elif op == "datestartswith":
+        result = text.str.startswith(target)
+    else:
+        result = {
+            "eq": text == target, "ne": text != target,
+            "lt": text < target, "le": text <= target,
+            "gt": text > target, "ge": text >= target,
+        }[op]
+    return result.to_numpy(dtype=bool)
+
+
+def filter_positions(df: pd.DataFrame, filter_query: str, case_sensitive: bool = True) -> np.ndarray:
+    """Row positions of `df` matching every clause of `filter_query`."""
+    keep = np.ones(len(df), dtype=bool)
+    for column, op, case, value in parse_filter(filter_query):
+        if column in df.columns:
+            keep &= _clause_mask(df[column], op, case_sensitive if case is None else case, value)
+    return np.flatnonzero(keep)
+
+
+def sort_positions(df: pd.DataFrame, positions: np.ndarray, sort_by: list[dict]) -> np.ndarray:
+    """Reorder row positions by a DataTable sort_by list (first entry wins)."""
+    sort_by = [s for s in sort_by or [] if s.get("column_id") in df.columns]
+    if not sort_by or not len(positions):
+        return positions
+    subset = df.iloc[positions].reset_index(drop=True)
+    order = subset.sort_values(
+        [s["column_id"] for s in sort_by],
+        ascending=[s.get("direction") != "desc" for s in sort_by],
+        kind="stable",
+    ).index.to_numpy()
+    return positions[order]
+
+
+class TableQueryEngine:
+    """
+    Answers DataTable page requests over DataFrames.
+
+    The filtered and sorted row order of recent (table, filter, sort)
+    combinations is memoized, so paging through a view only slices.
+    """
+
+    def __init__(self, max_views: int = 32, case_sensitive: bool = True):
+        self.max_views = max_views
+        self.case_sensitive = case_sensitive
+        self._views: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def positions(self, df: pd.DataFrame, filter_query: str = "", sort_by: list[dict] | None = None,
+                  key: str | None = None) -> np.ndarray:
+        """Filtered, sorted row positions; memoized when `key` identifies `df`."""
+        view = (key, filter_query or "", tuple((s.get("column_id"), s.get("direction")) for s in sort_by or []))
+        if key is not None:
+            with self._lock:
+                if view in self._views:
+                    self._views.move_to_end(view)
+                    return self._views[view]
+        positions = filter_positions(df, filter_query, self.case_sensitive)
+        positions = sort_positions(df, positions, sort_by)
+        if key is not None:
+            with self._lock:
+                self._views[view] = positions
+                while len(self._views) > self.max_views:
+                    self._views.popitem(last=False)
+        return positions
+
+    def page(self, df: pd.DataFrame, page_current: int, page_size: int,
+             sort_by: list[dict] | None = None, filter_query: str = "",
+             key: str | None = None) -> tuple[list[dict], int, int]:
+        """
+        One page of rows as DataTable records, with the page number actually
+        served (clamped to the filtered view) and the view's page count.
+        """
+        positions = self.positions(df, filter_query, sort_by, key)
+        page_count = max(1, -(-len(positions) // page_size))
+        page_current = min(page_current or 0, page_count - 1)
+        start = page_current * page_size
+        rows = df.iloc[positions[start:start + page_size]]
+        return rows.to_dict("records"), page_current, page_count